@@ -0,0 +1,350 @@
+"""Кэш в файле SQLite, общий для всех процессов на сервере.
+
+LocMemCache у каждого воркера gunicorn свой, и чем больше воркеров,
+тем реже попадания. Этот бэкенд хранит записи в одном файле SQLite
+(режим WAL, читатели не блокируют писателя), вытесняет давно
+не читавшиеся записи при превышении MAX_SIZE байт и умеет
+пересчитывать значение «одним полётом» с вероятностным досрочным
+истечением (get_or_compute).
+
+Настройка:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube_cache.sqlite3',
+            'OPTIONS': {'MAX_SIZE': 64 * 1024 * 1024},
+        }
+    }
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    delta REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('size', 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+    AFTER INSERT ON cache_entries BEGIN
+        UPDATE cache_meta SET value = value + NEW.size WHERE name = 'size';
+    END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+    AFTER DELETE ON cache_entries BEGIN
+        UPDATE cache_meta SET value = value - OLD.size WHERE name = 'size';
+    END;
+CREATE TABLE IF NOT EXISTS cache_locks (
+    key TEXT PRIMARY KEY,
+    until REAL NOT NULL
+);
+"""
+
+# время последнего чтения обновляется не чаще раза в секунду,
+# чтобы чтения почти никогда не превращались в запись
+ACCESS_RESOLUTION = 1.0
+POLL_INTERVAL = 0.05
+# ключей в одном запросе: SQLite ограничивает число параметров
+BATCH_SIZE = 500
+
+_MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        # после вытеснения остаётся запас, чтобы не чистить на каждой записи
+        self._target_size = int(self._max_size * 0.9)
+        self._lock_timeout = float(options.get('LOCK_TIMEOUT', 30))
+        self._local = threading.local()
+
+    def _connection(self):
+        # соединение своё у каждого потока и у каждого процесса после fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._lock_timeout,
+                isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _insert(self, connection, key, value, timeout, delta=0.0):
+        self._insert_many(connection, {key: value}, timeout, delta)
+
+    def _insert_many(self, connection, data, timeout, delta=0.0):
+        """Записывает {ключ: значение} и вытесняет лишнее один раз."""
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, blob, expires, now, len(blob), delta))
+        connection.executemany(
+            'DELETE FROM cache_entries WHERE key = ?',
+            [(row[0],) for row in rows],
+        )
+        connection.executemany(
+            'INSERT INTO cache_entries '
+            '(key, value, expires, accessed, size, delta) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+        self._evict(connection, list(data))
+
+    def _evict(self, connection, keep):
+        """Удаляет истёкшие, затем давно не читавшиеся записи.
+
+        Только что записанные ключи keep не вытесняются.
+        """
+        size = self._size(connection)
+        if size <= self._max_size:
+            return
+        connection.execute(
+            'DELETE FROM cache_entries WHERE expires < ?', (time.time(),)
+        )
+        excess = self._size(connection) - self._target_size
+        keep = set(keep)
+        stale = []
+        rows = connection.execute(
+            'SELECT key, size FROM cache_entries ORDER BY accessed'
+        )
+        for key, entry_size in rows:
+            if excess <= 0:
+                break
+            if key in keep:
+                continue
+            stale.append((key,))
+            excess -= entry_size
+        rows.close()
+        connection.executemany(
+            'DELETE FROM cache_entries WHERE key = ?', stale
+        )
+
+    def _size(self, connection):
+        size, = connection.execute(
+            "SELECT value FROM cache_meta WHERE name = 'size'"
+        ).fetchone()
+        return size
+
+    def _read(self, key):
+        """(значение, срок, delta) живой записи или _MISSING."""
+        return self._read_many([key]).get(key, _MISSING)
+
+    def _read_many(self, keys):
+        """{ключ: (значение, срок, delta)} живых записей.
+
+        Записи читаются запросом WHERE key IN (...), время чтения
+        устаревших по ACCESS_RESOLUTION обновляется одним UPDATE.
+        """
+        connection = self._connection()
+        now = time.time()
+        entries = {}
+        touched = []
+        keys = list(keys)
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed, delta '
+                'FROM cache_entries WHERE key IN (%s)'
+                % ', '.join('?' * len(batch)),
+                batch,
+            )
+            for key, blob, expires, accessed, delta in rows:
+                if expires is not None and expires <= now:
+                    continue
+                if now - accessed > ACCESS_RESOLUTION:
+                    touched.append(key)
+                entries[key] = pickle.loads(blob), expires, delta
+        for start in range(0, len(touched), BATCH_SIZE):
+            batch = touched[start:start + BATCH_SIZE]
+            connection.execute(
+                'UPDATE cache_entries SET accessed = ? WHERE key IN (%s)'
+                % ', '.join('?' * len(batch)),
+                [now, *batch],
+            )
+        return entries
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            if self._read(key) is not _MISSING:
+                return False
+            self._insert(connection, key, value, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        entry = self._read(self._key(key, version))
+        return default if entry is _MISSING else entry[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            self._insert(connection, key, value, timeout)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        return {
+            keys[key]: entry[0]
+            for key, entry in self._read_many(keys).items()
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if data:
+            data = {
+                self._key(key, version): value for key, value in data.items()
+            }
+            with self._write() as connection:
+                self._insert_many(connection, data, timeout)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            return connection.execute(
+                'UPDATE cache_entries SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_entries WHERE key = ?', (key,)
+            )
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        if keys:
+            with self._write() as connection:
+                connection.executemany(
+                    'DELETE FROM cache_entries WHERE key = ?', keys
+                )
+
+    def has_key(self, key, version=None):
+        return self._read(self._key(key, version)) is not _MISSING
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache_entries')
+            connection.execute('DELETE FROM cache_locks')
+
+    def close(self, **kwargs):
+        # соединения живут всё время работы процесса
+        pass
+
+    def _acquire(self, key):
+        now = time.time()
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_locks WHERE key = ? AND until < ?',
+                (key, now),
+            )
+            return connection.execute(
+                'INSERT OR IGNORE INTO cache_locks (key, until) '
+                'VALUES (?, ?)',
+                (key, now + self._lock_timeout),
+            ).rowcount == 1
+
+    def _release(self, key):
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_locks WHERE key = ?', (key,)
+            )
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT,
+                       version=None, beta=1.0):
+        """Значение из кэша или compute(), посчитанное одним процессом.
+
+        Досрочное истечение (XFetch): запись считается устаревшей
+        с вероятностью, растущей к концу срока пропорционально времени
+        пересчёта delta, поэтому популярный ключ обычно пересчитывается
+        до истечения. Пересчитывает тот, кто взял блокировку; остальные
+        отдают текущее значение, а если его нет — ждут результата.
+        compute() может вернуть None: такой результат не сохраняется.
+        """
+        key = self._key(key, version)
+        entry = self._read(key)
+        cached = _MISSING
+        if entry is not _MISSING:
+            value, expires, delta = entry
+            if expires is None:
+                return value
+            jitter = -delta * beta * math.log(1.0 - random.random())
+            if time.time() + jitter < expires:
+                return value
+            cached = value
+        if self._acquire(key):
+            try:
+                started = time.time()
+                value = compute()
+                if value is not None:
+                    with self._write() as connection:
+                        self._insert(
+                            connection, key, value, timeout,
+                            time.time() - started,
+                        )
+                return value
+            finally:
+                self._release(key)
+        if cached is not _MISSING:
+            return cached
+        deadline = time.time() + self._lock_timeout
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = self._read(key)
+            if entry is not _MISSING:
+                return entry[0]
+            if not self._locked(key):
+                entry = self._read(key)
+                break
+        return entry[0] if entry is not _MISSING else compute()
+
+    def _locked(self, key):
+        return self._connection().execute(
+            'SELECT 1 FROM cache_locks WHERE key = ? AND until >= ?',
+            (key, time.time()),
+        ).fetchone() is not None
@@ -0,0 +1,6 @@
+def view_name(request):
+    """Добавляет имя текущего представления, например 'posts:profile'."""
+    match = request.resolver_match
+    return {
+        'view_name': match.view_name if match else '',
+    }
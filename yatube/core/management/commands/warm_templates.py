@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+
+def template_names(directory):
+    """Имена всех шаблонов в каталоге относительно него."""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(('.html', '.txt')):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    """Компилирует шаблоны из каталогов TEMPLATES['DIRS'].
+
+    С кэширующим загрузчиком скомпилированные шаблоны остаются
+    в памяти процесса. Возвращает (число шаблонов, ошибки).
+    """
+    count = 0
+    errors = []
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in engine.engine.dirs:
+            for name in template_names(directory):
+                try:
+                    engine.get_template(name)
+                except TemplateSyntaxError as error:
+                    errors.append(f'{name}: {error}')
+                else:
+                    count += 1
+    return count, errors
+
+
+class Command(BaseCommand):
+    help = 'Компилирует все шаблоны проекта заранее, при старте воркера.'
+
+    def handle(self, *args, **options):
+        count, errors = warm_templates()
+        if errors:
+            raise CommandError('\n'.join(errors))
+        if options['verbosity']:
+            self.stdout.write(f'Скомпилировано шаблонов: {count}')
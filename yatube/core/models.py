@@ -1,3 +1,14 @@
-# from django.db import models
+from django.db import models
 
-# Create your models here.
+
+class StoredFile(models.Model):
+    """Счётчик ссылок на файл в ContentAddressedStorage."""
+    name = models.CharField('имя файла', max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField('число ссылок', default=0)
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
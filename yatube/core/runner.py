@@ -0,0 +1,33 @@
+"""Запуск тестов с отдельным файлом кэша.
+
+Тесты очищают кэш, а файл из настроек общий с сервером разработки:
+на время тестов CACHES указывает на временный файл.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='yatube_test_cache')
+        caches = {
+            alias: dict(
+                options,
+                LOCATION=os.path.join(self._cache_dir, f'{alias}.sqlite3'),
+            )
+            for alias, options in settings.CACHES.items()
+        }
+        self._cache_settings = override_settings(CACHES=caches)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
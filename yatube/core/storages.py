@@ -0,0 +1,142 @@
+"""Хранилище файлов с именами по хешу содержимого.
+
+Одинаковые загрузки хранятся одним файлом: повторная только
+увеличивает счётчик ссылок в StoredFile, а файл удаляется, когда
+уходит последняя ссылка. Файл пишется во временный рядом и
+атомарно переименовывается, поэтому по имени всегда лежит целый
+файл. Содержимое под именем не меняется, такие адреса можно
+кэшировать навсегда (см. IMMUTABLE_NAME).
+
+Миниатюры sorl пишутся тем же способом через AtomicFileSystemStorage.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+# имена, содержимое под которыми никогда не меняется: хранилища
+# по хешу и миниатюр sorl, тоже названных хешем
+IMMUTABLE_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32,64}\.')
+
+
+@deconstructible
+class AtomicFileSystemStorage(FileSystemStorage):
+    """Файлы под заданным именем, записанные целиком.
+
+    Файл пишется во временный рядом и атомарно переименовывается.
+    Повторная запись под тем же именем заменяет файл, а не создаёт
+    копию с суффиксом: одновременные генераторы одной миниатюры
+    не оставляют файлов, на которые ничто не ссылается.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                content.seek(0)
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+@deconstructible
+class ContentAddressedStorage(AtomicFileSystemStorage):
+
+    def content_name(self, name, content):
+        """Имя файла по SHA-256 содержимого, в каталоге исходного имени."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest[2:4],
+            digest + extension,
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        # ссылка берётся до проверки файла: release под той же блокировкой
+        # либо увидит её, либо удалит файл раньше, чем он проверен здесь
+        self.retain(name)
+        if not self.exists(name):
+            try:
+                self._write(name, content)
+            except BaseException:
+                self.release(name)
+                raise
+        return name
+
+    def retain(self, name):
+        """Добавляет ссылку на файл."""
+        with transaction.atomic():
+            updated = StoredFile.objects.filter(name=name).update(
+                refs=F('refs') + 1
+            )
+            if updated:
+                return
+            try:
+                with transaction.atomic():
+                    StoredFile.objects.create(name=name, refs=1)
+            except IntegrityError:
+                StoredFile.objects.filter(name=name).update(
+                    refs=F('refs') + 1
+                )
+
+    def release(self, name):
+        """Убирает ссылку; удаляет файл без ссылок. True, если удалён.
+
+        Файл, о котором нет записи (загружен до этого хранилища),
+        удаляется сразу. Файл удаляется под блокировкой записи, чтобы
+        одновременный save не взял ссылку на уже удаляемый файл.
+        """
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is not None and stored.refs > 1:
+                stored.refs = F('refs') - 1
+                stored.save(update_fields=['refs'])
+                return False
+            if stored is not None:
+                stored.delete()
+            super().delete(name)
+        return True
+
+    def delete(self, name):
+        self.release(name)
+
+
+def is_immutable(name):
+    return IMMUTABLE_NAME.search(name) is not None
@@ -1,3 +1,5 @@
+from functools import lru_cache, wraps
+
 from django.template import Library
 from django.template.defaultfilters import stringfilter
 # В template.Library зарегистрированы все встроенные теги и фильтры шаблонов;
@@ -5,6 +7,28 @@ from django.template.defaultfilters import stringfilter
 register = Library()
 
 
+def memoize(maxsize=1024):
+    """LRU-кэш результатов фильтра, не больше maxsize записей.
+
+    Ключ — все аргументы фильтра. Нехешируемые аргументы считаются
+    без кэша. Статистика попаданий — filter.cache_info().
+    """
+    def decorator(func):
+        cached = lru_cache(maxsize=maxsize)(func)
+
+        @wraps(func)
+        def wrapper(*args):
+            try:
+                return cached(*args)
+            except TypeError:
+                return func(*args)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
@@ -35,13 +59,7 @@ def print_dir(src):
     return dir(src)
 
 
-cash_strstr = {}
-
-
 @register.filter
+@memoize()
 def strstr(str1, str2):
-    cash_result = cash_strstr.get(str1)
-    if cash_result:
-        return cash_result
-    cash_strstr[str1] = str2 in str1
-    return cash_strstr[str1]
+    return str2 in str1
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from ..cache_backends import BATCH_SIZE, SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 2))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 2)
+
+    def test_expiry(self):
+        self.cache.set('key', 1, 0)
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('forever', 1, None)
+        self.assertEqual(self.cache.get('forever'), 1)
+
+    def test_shared_between_instances(self):
+        """Запись одного процесса видна другому через общий файл."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_evicts_least_recently_used(self):
+        cache = self.make_cache(MAX_SIZE=20000)
+        for n in range(40):
+            cache.set(f'key{n}', 'x' * 1000)
+        self.assertIsNone(cache.get('key0'))
+        self.assertIsNotNone(cache.get('key39'))
+        self.assertLessEqual(cache._size(cache._connection()), 20000)
+
+    def test_get_or_compute_single_flight(self):
+        """Одновременные промахи считают значение один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.cache.get_or_compute('key', compute, 60)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_get_or_compute_early_expiry(self):
+        """При большом beta значение пересчитывается до истечения."""
+        self.cache.get_or_compute('key', lambda: 'old', 60)
+        self.assertEqual(
+            self.cache.get_or_compute('key', lambda: 'new', 60), 'old'
+        )
+        self.cache._connection().execute(
+            'UPDATE cache_entries SET delta = 1'
+        )
+        self.assertEqual(
+            self.cache.get_or_compute('key', lambda: 'new', 60, beta=1e6),
+            'new',
+        )
+
+    def test_get_or_compute_skips_none(self):
+        self.assertIsNone(self.cache.get_or_compute('key', lambda: None))
+        self.assertFalse(self.cache.has_key('key'))
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 2}, 60)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete_many(['a', 'missing'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'b': 2})
+
+    def test_get_many_single_query(self):
+        keys = [f'key{n}' for n in range(BATCH_SIZE + 10)]
+        self.cache.set_many({key: key for key in keys})
+        statements = []
+        connection = self.cache._connection()
+        connection.set_trace_callback(statements.append)
+        self.addCleanup(connection.set_trace_callback, None)
+        self.assertEqual(len(self.cache.get_many(keys)), len(keys))
+        # два запроса на пачку: чтение и обновление времени чтения
+        # не чаще ACCESS_RESOLUTION
+        self.assertLessEqual(len(statements), 4)
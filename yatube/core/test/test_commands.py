@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+CACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+
+class WarmTemplatesCommandTests(SimpleTestCase):
+
+    @override_settings(TEMPLATES=CACHED_TEMPLATES)
+    def test_templates_compiled(self):
+        out = StringIO()
+        call_command('warm_templates', stdout=out)
+        self.assertIn('Скомпилировано шаблонов', out.getvalue())
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIn('base.html', loader.get_template_cache)
+        self.assertIn('posts/index.html', loader.get_template_cache)
+
+    def test_syntax_error(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'broken.html'), 'w') as file:
+            file.write('{% if %}')
+        templates = [{**settings.TEMPLATES[0], 'DIRS': [directory]}]
+        with override_settings(TEMPLATES=templates):
+            with self.assertRaisesMessage(CommandError, 'broken.html'):
+                call_command('warm_templates', stdout=StringIO())
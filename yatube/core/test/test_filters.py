@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+
+from ..templatetags.custom_filters import memoize, strstr
+
+
+class MemoizeTests(SimpleTestCase):
+
+    def setUp(self):
+        strstr.cache_clear()
+
+    def test_strstr_uses_both_arguments(self):
+        self.assertTrue(strstr('/profile/user/', 'profile/'))
+        self.assertFalse(strstr('/profile/user/', 'group/'))
+        self.assertFalse(strstr('/', 'profile/'))
+        self.assertFalse(strstr('/', 'profile/'))
+        info = strstr.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 3))
+
+    def test_bounded(self):
+        calls = []
+
+        @memoize(maxsize=2)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        for value in (1, 2, 3, 1):
+            double(value)
+        self.assertEqual(calls, [1, 2, 3, 1])
+        self.assertEqual(double.cache_info().currsize, 2)
+
+    def test_unhashable_argument(self):
+        @memoize()
+        def first(items):
+            return items[0]
+
+        self.assertEqual(first([1, 2]), 1)
+        self.assertEqual(first.cache_info().currsize, 0)
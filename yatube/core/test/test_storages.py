@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..models import StoredFile
+from ..storages import (
+    AtomicFileSystemStorage, ContentAddressedStorage, is_immutable
+)
+from ..views import media
+
+
+class AtomicFileSystemStorageTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = AtomicFileSystemStorage(location=self.location)
+
+    def test_overwrites_under_same_name(self):
+        first = self.storage.save('cache/a.webp', ContentFile(b'one'))
+        second = self.storage.save('cache/a.webp', ContentFile(b'two'))
+        self.assertEqual(first, 'cache/a.webp')
+        self.assertEqual(second, first)
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b'two')
+        self.assertEqual(
+            os.listdir(os.path.join(self.location, 'cache')), ['a.webp']
+        )
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_duplicates_share_file(self):
+        first = self.storage.save('posts/a.jpg', ContentFile(b'data'))
+        second = self.storage.save('posts/b.JPG', ContentFile(b'data'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith('posts/'))
+        self.assertTrue(is_immutable(first))
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 2)
+        directory = os.path.dirname(self.storage.path(first))
+        self.assertEqual(os.listdir(directory), [os.path.basename(first)])
+
+    def test_release(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'data'))
+        self.storage.save('posts/a.jpg', ContentFile(b'data'))
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(self.storage.release(name))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+
+class MediaViewTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.name = ContentAddressedStorage(location=self.location).save(
+            'posts/a.gif', ContentFile(b'GIF89a')
+        )
+
+    def test_immutable_cache_headers(self):
+        # маршрут /media/ подключается только при DEBUG
+        request = RequestFactory().get(f'/media/{self.name}')
+        with override_settings(MEDIA_ROOT=self.location):
+            response = media(request, self.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
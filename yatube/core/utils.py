@@ -0,0 +1,11 @@
+from itertools import islice
+
+
+def chunks(iterable, size):
+    """Списки по size элементов из iterable; последний — остаток."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
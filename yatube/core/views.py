@@ -1,4 +1,12 @@
+from django.conf import settings
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from .storages import is_immutable
+
+# год — верхняя граница max-age, которую соблюдают браузеры
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,16 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def media(request, path):
+    """Медиафайлы при DEBUG; файлы с именем по хешу кэшируются навсегда.
+
+    На боевом сервере медиа отдаёт nginx с теми же заголовками.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200 and is_immutable(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    return response
@@ -1,4 +1,11 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import FieldDoesNotExist
+from django.forms import Media
+from django.forms.models import BaseModelFormSet
 
 from .models import (
     Post,
@@ -6,9 +13,228 @@ from .models import (
     Comment,
     Follow,
 )
+from .paginator import (
+    CursorPaginator,
+    EstimatedCountPaginator,
+    InvalidCursor,
+    estimate_count,
+)
+
+CURSOR_VARS = ('after', 'before')
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """Фильтр по внешнему ключу с автокомплитом вместо списка значений.
+
+    Стандартный фильтр выводит в боковую панель все объекты связанной
+    модели. Здесь читается только выбранный, остальные подгружаются
+    autocomplete_view админки связанной модели, поэтому у неё должны
+    быть search_fields.
+    """
+    template = 'admin/posts/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.admin_site = model_admin.admin_site
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+
+    def field_choices(self, field, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        widget = AutocompleteSelect(
+            self.field.remote_field,
+            self.admin_site,
+            choices=self.field.formfield().choices,
+        )
+        yield {
+            'selected': self.lookup_val is not None,
+            'clear_url': changelist.get_query_string(
+                remove=[self.lookup_kwarg, self.lookup_kwarg_isnull]
+            ),
+            'widget': widget.render(self.lookup_kwarg, self.lookup_val, {
+                'id': f'filter_{self.lookup_kwarg}',
+                'style': 'width: 100%',
+                'data-filter-url': changelist.get_query_string(
+                    {self.lookup_kwarg: '__value__'},
+                    [self.lookup_kwarg_isnull],
+                ),
+            }),
+        }
+
+
+class RowAutocompleteSelect(AutocompleteSelect):
+    """Автокомплит, которому подпись выбранного объекта дают готовой.
+
+    В list_editable у каждой строки свой виджет, и обычный автокомплит
+    читал бы подпись отдельным запросом на строку.
+    """
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        if selected is None or list(value) != [str(selected.pk)]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        label = self.choices.field.label_from_instance(selected)
+        options.append(
+            self.create_option(name, selected.pk, label, True, len(options))
+        )
+        return [(None, options, 0)]
+
+
+class RowChoicesFormSet(BaseModelFormSet):
+    """Формы list_editable с подписями из уже загруженных строк.
+
+    Строки страницы могут прийти списком: так формы строятся по ним
+    без повторного запроса.
+    """
+
+    def get_queryset(self):
+        if isinstance(self.queryset, list):
+            return self.queryset
+        return super().get_queryset()
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        if form.instance.pk is None:
+            return
+        for name, field in form.fields.items():
+            # виджет админки обёрнут в RelatedFieldWidgetWrapper
+            widget = getattr(field.widget, 'widget', field.widget)
+            if isinstance(widget, RowAutocompleteSelect):
+                widget.selected = getattr(form.instance, name)
 
 
-class PostAdmin(admin.ModelAdmin):
+class KeysetChangeList(ChangeList):
+    """Список админки с keyset-пагинацией и оценкой числа строк.
+
+    При сортировке по обычным полям модели страницы листаются
+    курсором (?after= / ?before=) и стоят одинаково на любой глубине.
+    При сортировке по связанным полям и выражениям остаются номера
+    страниц, но без точного COUNT(*).
+    """
+    cursor_page = None
+    count_is_estimate = False
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for name in CURSOR_VARS:
+            lookup_params.pop(name, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # курсор относится к текущим фильтрам и сортировке
+        return super().get_query_string(
+            new_params, [*(remove or ()), *CURSOR_VARS]
+        )
+
+    def keyset_ordering(self):
+        """Сортировка выборки для CursorPaginator или None.
+
+        Подходят только непустые поля самой модели: по ним работает
+        сравнение «после ключа».
+        """
+        ordering = []
+        for part in self.queryset.query.order_by:
+            if not isinstance(part, str):
+                return None
+            name = part.lstrip('-')
+            if name == 'pk':
+                name = self.lookup_opts.pk.name
+            try:
+                field = self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if field.is_relation or field.null or not field.concrete:
+                return None
+            ordering.append(part[:len(part) - len(part.lstrip('-'))] + name)
+        return ordering or None
+
+    def get_results(self, request):
+        ordering = self.keyset_ordering()
+        if ordering is None or self.show_all:
+            super().get_results(request)
+        else:
+            self.get_keyset_results(request, ordering)
+        self.count_is_estimate = (
+            self.result_count >= settings.ESTIMATED_COUNT_LIMIT
+        )
+
+    def get_keyset_results(self, request, ordering):
+        paginator = CursorPaginator(
+            self.queryset, self.list_per_page, ordering
+        )
+        try:
+            page = paginator.page(
+                after=request.GET.get('after'),
+                before=request.GET.get('before'),
+            )
+        except InvalidCursor:
+            raise IncorrectLookupParameters
+        self.result_count = estimate_count(self.queryset)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        # строки уже с list_select_related: self.queryset их применил;
+        # формсет list_editable принимает список (RowChoicesFormSet)
+        self.result_list = list(page)
+        self.can_show_all = self.result_count <= self.list_max_show_all
+        # номера страниц не нужны: ссылки курсора выводит pagination.html
+        self.multi_page = False
+        self.paginator = paginator
+        self.cursor_page = page
+        self.first_url = self.get_query_string()
+        self.next_url = page.has_next() and self.get_query_string(
+            {'after': page.next_cursor}
+        )
+        self.previous_url = page.has_previous() and self.get_query_string(
+            {'before': page.previous_cursor}
+        )
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Админка, число запросов которой не растёт с размером таблиц.
+
+    Список листается курсором, строки не пересчитываются полностью,
+    внешние ключи в формах и list_editable выбираются автокомплитом.
+    Связанные объекты из list_display нужно перечислить
+    в list_select_related.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault('formset', RowChoicesFormSet)
+        return super().get_changelist_formset(request, **kwargs)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', RowAutocompleteSelect(
+                db_field.remote_field,
+                self.admin_site,
+                using=kwargs.get('using'),
+            ))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, None).media + Media(
+            js=['js/admin_filters.js']
+        )
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -17,8 +243,10 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date', 'author')
+    list_filter = ('pub_date', ('author', AutocompleteFilter))
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
 
@@ -27,9 +255,10 @@ class GroupAdmin(admin.ModelAdmin):
         'pk',
         'title',
     )
+    search_fields = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'post',
@@ -37,17 +266,26 @@ class CommentAdmin(admin.ModelAdmin):
         'text',
         'created',
     )
-    search_fields = ('pk', 'text', 'post', 'author')
-    list_filter = ('created', 'post', 'author')
+    list_select_related = ('post', 'author')
+    # автор ищется точным совпадением, по индексу; пост — фильтром
+    search_fields = ('pk', 'text', '=author__username')
+    list_filter = (
+        'created',
+        ('post', AutocompleteFilter),
+        ('author', AutocompleteFilter),
+    )
+    autocomplete_fields = ('post', 'parent', 'author')
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'user',
         'author'
     )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,198 @@
+"""Кэш страниц лент с версиями, которые сбрасываются событиями.
+
+У каждой области — общей ленты, группы, автора, поста — есть версия
+в кэше. Она входит в ключ закэшированных страниц и меняется сигналами
+при сохранении и удалении постов, комментариев и подписок. Поэтому
+страницы можно хранить долго: после изменения они просто перестают
+находиться по новому ключу.
+
+Тот же хеш пути и версий служит ETag страницы: повторный запрос
+с If-None-Match получает 304 без запросов к постам и отрисовки.
+Версия начинается со времени сброса, и самое позднее из них служит
+Last-Modified: оно не уходит назад, что бы ни изменилось в области.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+VERSION_PREFIX = 'feed-version:'
+PAGE_PREFIX = 'feed-page:'
+
+GLOBAL_SCOPE = 'global'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def suggestions_scope(user_id):
+    return f'suggestions:{user_id}'
+
+
+def _new_version():
+    # время сброса в миллисекундах и случайная часть, а не счётчик:
+    # после вытеснения ключа версия не совпадёт с той, под которой
+    # лежат старые страницы
+    return f'{int(time.time() * 1000):x}-{uuid.uuid4().hex[:8]}'
+
+
+def versions_modified(versions):
+    """Время последнего сброса среди версий или None."""
+    stamps = []
+    for version in versions:
+        stamp, _, _ = version.partition('-')
+        try:
+            stamps.append(int(stamp, 16))
+        except ValueError:
+            # версия старого вида, без времени
+            return None
+    if not stamps:
+        return None
+    return datetime.fromtimestamp(max(stamps) / 1000, timezone.utc)
+
+
+def get_versions(scopes):
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбрасывает версии областей сейчас и ещё раз после коммита.
+
+    Второй сброс нужен, чтобы страница, отрисованная до коммита
+    по старым данным, не осталась в кэше под новой версией.
+    """
+    scopes = [scope for scope in scopes if scope]
+
+    def set_versions():
+        cache.set_many(
+            {VERSION_PREFIX + scope: _new_version() for scope in scopes},
+            None
+        )
+
+    set_versions()
+    transaction.on_commit(set_versions)
+
+
+def bump_post(post, old_group_id=None):
+    """Сбрасывает кэш всех лент, в которых виден пост."""
+    bump(
+        GLOBAL_SCOPE,
+        author_scope(post.author_id),
+        post_scope(post.pk),
+        post.group_id and group_scope(post.group_id),
+        old_group_id and group_scope(old_group_id),
+    )
+
+
+def _digest(request, versions, *parts):
+    raw = ':'.join(
+        [request.get_full_path()]
+        + versions
+        + [str(part) for part in parts]
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_key(request, scopes):
+    # страницы не зависят от пользователя: его части приходят
+    # отдельным запросом (posts:user_fragments)
+    return PAGE_PREFIX + _digest(request, get_versions(scopes))
+
+
+def page_etag(request, scopes, *parts):
+    """ETag страницы по версиям областей и дополнительным частям."""
+    return quote_etag(_digest(request, get_versions(scopes), *parts))
+
+
+def conditional_response(request, etag, render_page, last_modified=None):
+    """304, если у клиента та же версия страницы, иначе render_page().
+
+    Ответ помечается no-cache: браузер и прокси хранят страницу,
+    но перед показом сверяют её валидаторы с сервером.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return render_page()
+    timestamp = last_modified and int(last_modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    if response is None:
+        response = render_page()
+        if response.status_code != 200:
+            return response
+        response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _get_or_compute(key, compute, timeout):
+    """get_or_compute бэкенда, если он есть, иначе get/set."""
+    if hasattr(cache, 'get_or_compute'):
+        return cache.get_or_compute(key, compute, timeout)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, timeout)
+    return value
+
+
+def cached_response(request, scopes, render_page, last_modified=False):
+    """Ответ из кэша или результат render_page(), сохранённый в кэш.
+
+    Страницу пересчитывает один процесс, даже если её одновременно
+    запросили многие (если бэкенд кэша это умеет). С last_modified
+    ответ получает Last-Modified по последнему сбросу версий областей.
+    """
+    if request.method != 'GET':
+        return render_page()
+    versions = get_versions(scopes)
+    digest = _digest(request, versions)
+    return conditional_response(
+        request,
+        quote_etag(digest),
+        lambda: _cached_page(PAGE_PREFIX + digest, render_page),
+        last_modified and versions_modified(versions),
+    )
+
+
+def _cached_page(key, render_page):
+    rendered = {}
+
+    def compute():
+        response = rendered['response'] = render_page()
+        if response.status_code != 200:
+            return None
+        return response.content, response['Content-Type']
+
+    cached = _get_or_compute(key, compute, settings.FEED_CACHE_TIMEOUT)
+    if 'response' in rendered:
+        return rendered['response']
+    if cached is None:
+        return render_page()
+    content, content_type = cached
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,33 @@
+from django.core.checks import Error, Tags, register
+from django.db import DatabaseError, connection
+from django.db.migrations.recorder import MigrationRecorder
+
+from . import search
+
+SEARCH_MIGRATION = ('posts', '0013_post_search')
+
+
+@register(Tags.database)
+def check_search_index(app_configs, **kwargs):
+    """Индекс поиска и его триггеры на месте после миграций.
+
+    Миграция, меняющая поля Post, пересоздаёт таблицу в SQLite
+    без триггеров, и поиск молча перестаёт видеть новые посты.
+    """
+    if not search.supported():
+        return []
+    try:
+        applied = MigrationRecorder(connection).applied_migrations()
+        if SEARCH_MIGRATION not in applied:
+            return []
+        missing = search.missing_objects()
+    except DatabaseError:
+        return []
+    if not missing:
+        return []
+    return [Error(
+        'Нет объектов полнотекстового индекса постов: '
+        + ', '.join(missing) + '.',
+        hint='Выполните python manage.py rebuild_search.',
+        id='posts.E001',
+    )]
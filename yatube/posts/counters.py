@@ -0,0 +1,90 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются одним UPDATE ... SET x = x + 1 в той же транзакции,
+что и создание или удаление строки; recount() пересчитывает их
+по данным, если они разошлись.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import UserStats
+
+
+def change(queryset, field, delta):
+    """Атомарно сдвигает счётчик, не уводя его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_user(user_id, field, delta):
+    updated = change(UserStats.objects.filter(pk=user_id), field, delta)
+    if not updated and delta > 0:
+        # строки счётчиков ещё нет, например у пользователя из фикстуры
+        UserStats.objects.get_or_create(user_id=user_id)
+        change(UserStats.objects.filter(pk=user_id), field, delta)
+
+
+def user_stats(user):
+    """Счётчики пользователя; строка создаётся, если её ещё нет."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats.objects.get_or_create(user=user)[0]
+
+
+def _actual(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def recount():
+    """Пересчитывает все счётчики по данным.
+
+    Возвращает словарь {счётчик: число исправленных строк}.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    Stats = apps.get_model('posts', 'UserStats')
+
+    Stats.objects.bulk_create(
+        [
+            Stats(user_id=user_id)
+            for user_id in User.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    counters = {
+        'group.posts_count': (Group, 'posts_count', Post, 'group'),
+        'post.comments_count': (Post, 'comments_count', Comment, 'post'),
+        'user.posts_count': (Stats, 'posts_count', Post, 'author'),
+        'user.followers_count': (Stats, 'followers_count', Follow, 'author'),
+        'user.following_count': (Stats, 'following_count', Follow, 'user'),
+        'user.feed_length': (Stats, 'feed_length', FeedItem, 'user'),
+    }
+    repaired = {}
+    for name, (model, field, source, source_field) in counters.items():
+        actual = _actual(source, source_field)
+        repaired[name] = model.objects.annotate(
+            actual=actual
+        ).exclude(**{field: F('actual')}).count()
+        if repaired[name]:
+            model.objects.update(**{field: actual})
+    return repaired
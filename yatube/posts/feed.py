@@ -0,0 +1,272 @@
+"""Лента подписок: гибрид fan-out on write и чтения по запросу.
+
+При публикации пост раскладывается по лентам подписчиков автора,
+при подписке лента дополняется последними постами автора, при
+отписке — очищается от них. Длина ленты ограничена настройкой
+FEED_INBOX_LENGTH: счётчик UserStats.feed_length растёт вместе
+с лентой, и обрезаются только ленты, счётчик которых превысил предел.
+
+Посты авторов, у которых подписчиков больше FEED_PULL_THRESHOLD,
+по лентам не раскладываются: их читают при открытии ленты и сливают
+с материализованной частью по дате публикации. Такой автор отмечается
+в UserStats.feed_pulled и читается, пока отметка стоит, даже если
+подписчиков стало меньше порога. Снимает её только settle() из команды
+heavy_authors --settle, разложив последние посты автора по лентам
+подписчиков: в запросах публикации и подписки это слишком долго.
+"""
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max
+
+from core.utils import chunks
+
+from . import counters
+from .caching import author_scope
+from .follows import following_ids
+from .models import FeedItem, Follow, Post, UserStats
+from .paginator import CursorPaginator, MergedCursorPaginator, paginate
+
+HEAVY_AUTHORS_CACHE_KEY = 'feed:heavy_authors'
+HEAVY_AUTHORS_TIMEOUT = 60
+
+
+def followers_by_author(threshold):
+    """Авторы с числом подписчиков больше threshold: {id: подписчики}."""
+    return dict(
+        UserStats.objects.filter(
+            followers_count__gt=threshold
+        ).values_list('user_id', 'followers_count')
+    )
+
+
+def heavy_author_ids():
+    """id авторов, чьи посты читаются в ленту при запросе."""
+    author_ids = cache.get(HEAVY_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = set(followers_by_author(settings.FEED_PULL_THRESHOLD))
+        author_ids.update(UserStats.objects.filter(
+            feed_pulled=True
+        ).values_list('user_id', flat=True))
+        cache.set(HEAVY_AUTHORS_CACHE_KEY, author_ids, HEAVY_AUTHORS_TIMEOUT)
+    return author_ids
+
+
+def _feed_item(user_id, post):
+    return FeedItem(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def grow(user_ids, added):
+    """Учитывает added новых записей в лентах пользователей."""
+    UserStats.objects.filter(pk__in=user_ids).update(
+        feed_length=F('feed_length') + added
+    )
+
+
+def trim(user_ids):
+    """Обрезает до FEED_INBOX_LENGTH ленты, счётчик которых превысил предел.
+
+    Счётчик читается по первичному ключу, записи лент не пересчитываются.
+    """
+    limit = settings.FEED_INBOX_LENGTH
+    overflowed = UserStats.objects.filter(
+        pk__in=user_ids, feed_length__gt=limit
+    ).values_list('pk', flat=True)
+    for user_id in overflowed:
+        items = FeedItem.objects.filter(user_id=user_id)
+        stale = items.order_by(
+            '-pub_date', '-post_id'
+        ).values_list('id', flat=True)[limit:]
+        FeedItem.objects.filter(pk__in=list(stale)).delete()
+        UserStats.objects.filter(pk=user_id).update(
+            feed_length=items.count()
+        )
+
+
+def _push(user_ids, posts):
+    """Раскладывает посты по лентам пользователей."""
+    with transaction.atomic():
+        FeedItem.objects.bulk_create(
+            [
+                _feed_item(user_id, post)
+                for user_id in user_ids
+                for post in posts
+            ],
+            ignore_conflicts=True,
+        )
+        # записи, которые уже были в ленте, счётчик завышают: это
+        # исправит обрезка
+        grow(user_ids, len(posts))
+        trim(user_ids)
+
+
+def _latest_posts(author_id, after_id=0):
+    return list(Post.objects.filter(
+        author_id=author_id, pk__gt=after_id
+    ).order_by('-pub_date', '-id')[:settings.FEED_INBOX_LENGTH])
+
+
+def _follower_ids(author_id, after_id=0):
+    return Follow.objects.filter(
+        author_id=author_id, pk__gt=after_id
+    ).values_list('user_id', flat=True)
+
+
+def keep_pulled(author_id):
+    """Оставляет автора читаемым при запросе.
+
+    Строку счётчиков автора публикация и подписка уже заблокировали,
+    поэтому отметка не разминётся с одновременным settle().
+    """
+    UserStats.objects.filter(pk=author_id).update(feed_pulled=True)
+
+
+def settle(author_id, batch_size=1000):
+    """Раскладывает посты отмеченного автора, если он больше не крупный.
+
+    Посты и подписки на момент начала раскладываются пачками
+    подписчиков. Затем под блокировкой строки счётчиков автора
+    докладываются появившиеся за это время, и отметка снимается.
+    Публикация или подписка со старым списком крупных авторов снова
+    ставит отметку. True, если отметка снята.
+    """
+    stats = UserStats.objects.filter(pk=author_id).first()
+    if (stats is None or not stats.feed_pulled
+            or stats.followers_count > settings.FEED_PULL_THRESHOLD):
+        return False
+    last_post_id = Post.objects.filter(
+        author_id=author_id
+    ).aggregate(Max('id'))['id__max'] or 0
+    last_follow_id = Follow.objects.filter(
+        author_id=author_id
+    ).aggregate(Max('id'))['id__max'] or 0
+    posts = _latest_posts(author_id)
+    followers = _follower_ids(author_id).filter(pk__lte=last_follow_id)
+    for follower_ids in chunks(followers.iterator(), batch_size):
+        _push(follower_ids, posts)
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().get(pk=author_id)
+        if stats.followers_count > settings.FEED_PULL_THRESHOLD:
+            return False
+        new_posts = _latest_posts(author_id, last_post_id)
+        if new_posts:
+            for follower_ids in chunks(
+                _follower_ids(author_id).iterator(), batch_size
+            ):
+                _push(follower_ids, new_posts)
+        new_follower_ids = list(_follower_ids(author_id, last_follow_id))
+        if new_follower_ids:
+            _push(new_follower_ids, _latest_posts(author_id))
+        stats.feed_pulled = False
+        stats.save(update_fields=['feed_pulled'])
+    cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+    return True
+
+
+def settle_all():
+    """Раскладывает посты всех отмеченных авторов ниже порога."""
+    author_ids = UserStats.objects.filter(
+        feed_pulled=True,
+        followers_count__lte=settings.FEED_PULL_THRESHOLD,
+    ).values_list('user_id', flat=True)
+    return sum(settle(author_id) for author_id in list(author_ids))
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if post.author_id in heavy_author_ids():
+        keep_pulled(post.author_id)
+        return
+    follower_ids = list(_follower_ids(post.author_id))
+    if follower_ids:
+        _push(follower_ids, [post])
+
+
+def backfill(user_id, author_id):
+    """Переносит в ленту последние посты автора после подписки."""
+    if author_id in heavy_author_ids():
+        keep_pulled(author_id)
+        return
+    posts = _latest_posts(author_id)
+    if posts:
+        _push([user_id], posts)
+
+
+def drop_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    deleted, _ = FeedItem.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+    if deleted:
+        counters.change_user(user_id, 'feed_length', -deleted)
+
+
+def pulled_author_ids(user):
+    """Авторы из подписок пользователя, которых нет в его ленте."""
+    heavy = heavy_author_ids()
+    if not heavy:
+        return []
+    return sorted(following_ids(user.pk) & heavy)
+
+
+def feed_scopes(user):
+    """Области кэша, от которых зависит лента подписок пользователя.
+
+    Версия автора меняется при его публикациях и правках, версия
+    самого пользователя — при подписке и отписке.
+    """
+    return [author_scope(user.pk)] + [
+        author_scope(author_id) for author_id in sorted(following_ids(user.pk))
+    ]
+
+
+def feed_page(request, user, per_page):
+    """Страница ленты подписок.
+
+    Материализованная лента читается одним диапазоном по индексу,
+    посты крупных авторов — отдельным диапазоном на автора; окна
+    сливаются потоково. Ключ курсора у всех выборок — (pub_date, id
+    поста), поэтому пост, попавший и в ленту, и в чтение, схлопывается.
+    Нумерованные страницы (?page=) для старых ссылок читаются по
+    подпискам напрямую, как в paginate.
+    """
+    if 'page' in request.GET:
+        return paginate(
+            request,
+            Post.objects.filter(author__following__user=user).select_related(
+                'author', 'group'
+            ),
+            per_page,
+        )
+    inbox = CursorPaginator(
+        FeedItem.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        ),
+        per_page,
+        ('-pub_date', '-post_id'),
+        transform=attrgetter('post'),
+    )
+    pulled = [
+        CursorPaginator(
+            Post.objects.filter(author_id=author_id).select_related(
+                'author', 'group'
+            ),
+            per_page,
+        )
+        for author_id in pulled_author_ids(user)
+    ]
+    paginator = (
+        MergedCursorPaginator([inbox] + pulled, per_page)
+        if pulled else inbox
+    )
+    return paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
@@ -0,0 +1,71 @@
+"""Граф подписок с кэшем множеств авторов каждого пользователя.
+
+Множество id авторов, на которых подписан пользователь, читается
+одним запросом и хранится в кэше. По нему отвечают проверки подписки,
+в том числе сразу для всех авторов страницы, и строятся области кэша
+ленты подписок. Сигналы подписки и отписки сбрасывают множество.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import Follow
+
+FOLLOWING_PREFIX = 'following:'
+FOLLOWING_TIMEOUT = 60 * 60 * 24
+
+
+def _key(user_id):
+    return f'{FOLLOWING_PREFIX}{user_id}'
+
+
+def following_ids(user_id):
+    """frozenset id авторов, на которых подписан пользователь."""
+    key = _key(user_id)
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = frozenset(
+            Follow.objects.filter(user_id=user_id).values_list(
+                'author_id', flat=True
+            )
+        )
+        cache.set(key, author_ids, FOLLOWING_TIMEOUT)
+    return author_ids
+
+
+def is_following(user, author_ids):
+    """Те из author_ids, на кого подписан user, — без запроса на автора."""
+    if not user.is_authenticated:
+        return set()
+    return following_ids(user.pk).intersection(author_ids)
+
+
+def follow(user, author):
+    """Подписывает user на author; True, если подписки ещё не было.
+
+    Один INSERT без предварительной проверки: повтор и гонку двух
+    запросов отсекает уникальное ограничение.
+    """
+    if user.pk == author.pk:
+        return False
+    try:
+        Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Отписывает user от author; True, если подписка была."""
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
+
+
+def forget(user_id):
+    """Сбрасывает множество подписок сейчас и ещё раз после коммита.
+
+    Как и caching.bump: второй сброс убирает множество, прочитанное
+    до коммита по старым данным.
+    """
+    key = _key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -1,5 +1,7 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
+
+from . import images
 from .models import Post, Comment
 
 
@@ -31,8 +33,26 @@ class PostForm(forms.ModelForm):
             )
         return data
 
+    def clean_image(self):
+        """Ограничивает размер загруженной картинки в байтах и пикселях."""
+        image = self.cleaned_data['image']
+        if image and not getattr(image, '_committed', False):
+            images.check_limits(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
-        fields = ['text']
+        fields = ['text', 'parent']
+        widgets = {
+            'parent': forms.HiddenInput,
+        }
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ответить можно только на комментарий того же поста
+        if post is not None:
+            self.fields['parent'].queryset = Comment.objects.filter(
+                post=post
+            )
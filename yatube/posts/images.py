@@ -0,0 +1,65 @@
+"""Приём картинок постов: ограничения, уменьшение, очистка метаданных.
+
+Оригинал хранится не больше POST_IMAGE_MAX_SIDE по длинной стороне
+и без EXIF и прочих метаданных. Показываются не оригиналы, а миниатюры,
+поэтому WebP-варианты готовятся для них (см. posts.thumbnails).
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# форматы, которые перекодируются при приёме; GIF не трогаем,
+# чтобы не потерять анимацию
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85},
+}
+
+
+def check_limits(file):
+    """Проверяет размер файла и число пикселей загруженной картинки."""
+    if file.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+        )
+    # forms.ImageField уже открыл картинку и оставил её в file.image
+    image = getattr(file, 'image', None)
+    if image is None:
+        file.seek(0)
+        image = Image.open(file)
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+
+
+def normalize(file):
+    """Уменьшенная копия картинки без метаданных или None.
+
+    None — формат не перекодируется, файл сохраняется как есть.
+    """
+    file.seek(0)
+    image = Image.open(file)
+    image_format = image.format
+    if image_format not in SAVE_OPTIONS:
+        return None
+    # поворот из EXIF применяется до того, как EXIF будет отброшен
+    image = ImageOps.exif_transpose(image)
+    side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((side, side))
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    content = BytesIO()
+    image.save(content, image_format, **SAVE_OPTIONS[image_format])
+    return ContentFile(content.getvalue(), name=os.path.basename(file.name))
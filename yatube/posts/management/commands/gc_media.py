@@ -0,0 +1,122 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from core.models import StoredFile
+from core.utils import chunks
+from posts import thumbnails
+from posts.models import Post
+
+
+def referenced_names():
+    """Имена всех нужных файлов: картинки постов и их миниатюры.
+
+    Имена миниатюр вычисляются так же, как их даёт sorl, без чтения
+    хранилища ключ-значение.
+    """
+    names = set()
+    for name in Post.objects.exclude(image='').values_list(
+        'image', flat=True
+    ).iterator():
+        names.add(name)
+        source = thumbnails.source(name)
+        for geometry, options in thumbnails.THUMBNAILS.values():
+            thumbnail = thumbnails.thumbnail_file(source, geometry, options)
+            names.add(thumbnail.name)
+    return names
+
+
+def media_files(root, directories, min_age):
+    """Файлы каталогов MEDIA_ROOT старше min_age секунд, потоком.
+
+    Свежие пропускаются: картинка могла быть записана, а пост с ней
+    ещё не закоммичен.
+    """
+    deadline = time.time() - min_age
+    stack = [os.path.join(root, directory) for directory in directories]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.stat().st_mtime < deadline:
+                    name = os.path.relpath(entry.path, root)
+                    yield name.replace(os.sep, '/'), entry.stat().st_size
+
+
+def forget(names):
+    """Убирает удалённые файлы из счётчиков и хранилища sorl."""
+    StoredFile.objects.filter(name__in=names).delete()
+    storage = Post._meta.get_field('image').storage
+    keys = []
+    for name in names:
+        # файл мог быть и картинкой поста, и миниатюрой
+        for image in (ImageFile(name, storage), ImageFile(name)):
+            keys.append(add_prefix(image.key))
+            keys.append(add_prefix(image.key, 'thumbnails'))
+    KVStore.objects.filter(key__in=keys).delete()
+    caches[sorl_settings.THUMBNAIL_CACHE].delete_many(keys)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT картинки, на которые не ссылается ни один '
+        'пост, их WebP-варианты и миниатюры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов проверять и удалять за раз.',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+
+    def handle(self, *args, **options):
+        referenced = referenced_names()
+        upload_to = Post._meta.get_field('image').upload_to
+        directories = [upload_to, sorl_settings.THUMBNAIL_PREFIX]
+        files = media_files(
+            settings.MEDIA_ROOT, directories, options['min_age']
+        )
+        checked = removed = freed = 0
+        for chunk in chunks(files, options['batch_size']):
+            checked += len(chunk)
+            orphans = [
+                (name, size) for name, size in chunk
+                if name not in referenced
+            ]
+            for name, size in orphans:
+                if options['dry_run'] or options['verbosity'] > 1:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    try:
+                        os.remove(os.path.join(settings.MEDIA_ROOT, name))
+                    except FileNotFoundError:
+                        pass
+            if orphans and not options['dry_run']:
+                forget([name for name, _ in orphans])
+            removed += len(orphans)
+            freed += sum(size for _, size in orphans)
+        action = 'будет удалено' if options['dry_run'] else 'удалено'
+        self.stdout.write(
+            f'Проверено файлов: {checked}, {action}: {removed} '
+            f'({freed} байт)'
+        )
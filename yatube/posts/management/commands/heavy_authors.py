@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.feed import followers_by_author, settle_all
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает авторов, у которых подписчиков больше порога: '
+        'их посты не раскладываются по лентам, а читаются при запросе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=None,
+            help='Порог числа подписчиков (по умолчанию '
+                 'FEED_PULL_THRESHOLD).',
+        )
+        parser.add_argument(
+            '--settle',
+            action='store_true',
+            help='Разложить по лентам посты авторов, которые опустились '
+                 'ниже FEED_PULL_THRESHOLD.',
+        )
+
+    def handle(self, *args, **options):
+        if options['settle']:
+            self.stdout.write(f'Разложено авторов: {settle_all()}')
+        threshold = options['threshold']
+        if threshold is None:
+            threshold = settings.FEED_PULL_THRESHOLD
+        followers = followers_by_author(threshold)
+        usernames = dict(
+            User.objects.filter(pk__in=followers).values_list(
+                'pk', 'username'
+            )
+        )
+        self.stdout.write(
+            f'Порог: {threshold}, авторов выше порога: {len(followers)}'
+        )
+        ranked = sorted(followers.items(), key=lambda item: -item[1])
+        for author_id, count in ranked:
+            self.stdout.write(f'{usernames[author_id]}\t{count}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт полнотекстовый индекс постов и его триггеры, если их нет, '
+        'и заново индексирует все посты.'
+    )
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        search.install()
+        self.stdout.write(f'Проиндексировано постов: {Post.objects.count()}')
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.utils import chunks
+from posts import suggestions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «Кого почитать»: авторов второго '
+        'круга подписок и соседей по группам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help=(
+                'Пересчитать только пользователей, у которых или у чьих '
+                'подписок изменились подписки.'
+            ),
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько пользователей считать за раз.',
+        )
+
+    def handle(self, *args, **options):
+        # отметка — время начала: подписки, изменённые во время
+        # пересчёта, попадут в следующий инкрементальный запуск
+        started = timezone.now()
+        if options['incremental']:
+            user_ids = suggestions.stale_user_ids()
+        else:
+            user_ids = User.objects.order_by('pk').values_list(
+                'pk', flat=True
+            ).iterator()
+        updated = 0
+        for chunk in chunks(user_ids, options['batch_size']):
+            suggested = suggestions.compute(
+                chunk, settings.SUGGESTIONS_PER_USER
+            )
+            suggestions.store(suggested, started)
+            updated += len(chunk)
+        self.stdout.write(f'Пересчитано пользователей: {updated}')
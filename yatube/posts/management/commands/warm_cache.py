@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from posts import thumbnails
+from posts.models import Group, Post, UserStats
+from posts.paginator import CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+
+def feed_pages(url, posts, pages):
+    """Адреса первых pages страниц ленты и посты на них."""
+    paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+    urls = []
+    shown = []
+    cursor = None
+    for _ in range(pages):
+        page = paginator.page(after=cursor)
+        urls.append(f'{url}?{urlencode({"after": cursor})}' if cursor else url)
+        shown.extend(page)
+        if not page.has_next():
+            break
+        cursor = page.next_cursor
+    return urls, shown
+
+
+def warm_page(url):
+    """Отрисовывает страницу гостю тем же view, что и при запросе.
+
+    Страницы лент от пользователя не зависят: его части приходят
+    отдельным запросом, поэтому middleware не нужны.
+    """
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    # как в обработчике запросов: по resolver_match шаблоны узнают,
+    # какая это страница (контекстный процессор view_name)
+    match = request.resolver_match = resolve(request.path_info)
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url}: {response.status_code}')
+
+
+def warm_thumbnail(name):
+    thumbnails.generate(name)
+
+
+def run_tasks(tasks, concurrency, timeout):
+    """Выполняет задачи (функция, аргумент) не дольше timeout секунд.
+
+    Потоки — демоны: по истечении времени команда завершается,
+    не дожидаясь начатых задач, а новые задачи не начинаются.
+    Возвращает (число готовых, ошибки, число не успевших).
+    """
+    deadline = time.monotonic() + timeout
+    pending = queue.Queue()
+    for task in tasks:
+        pending.put(task)
+    lock = threading.Lock()
+    done = []
+    errors = []
+
+    def work():
+        # у каждого потока своё соединение с базой
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    task, arg = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    task(arg)
+                except Exception as error:
+                    with lock:
+                        errors.append(error)
+                else:
+                    with lock:
+                        done.append(arg)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=work, daemon=True)
+        for _ in range(min(concurrency, len(tasks)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+    with lock:
+        return len(done), list(errors), len(tasks) - len(done) - len(errors)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет кэш после деплоя или очистки: первые страницы ленты, '
+        'самых активных групп и популярных авторов и миниатюры постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=3,
+            help='Сколько первых страниц каждой ленты прогреть.',
+        )
+        parser.add_argument(
+            '--groups', type=int, default=10,
+            help='Сколько групп с наибольшим числом постов прогреть.',
+        )
+        parser.add_argument(
+            '--profiles', type=int, default=10,
+            help='Сколько авторов с наибольшим числом подписчиков прогреть.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число потоков.',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Ограничение времени в секундах; по его истечении '
+                 'команда завершается, начатое обрывается.',
+        )
+
+    def collect(self, options):
+        """Адреса страниц и картинки постов на них."""
+        pages = options['pages']
+        feeds = [(reverse('posts:index'), Post.objects.all())]
+        for group in Group.objects.order_by('-posts_count')[
+            :options['groups']
+        ]:
+            feeds.append((
+                reverse('posts:group_list', args=[group.slug]),
+                group.posts.all(),
+            ))
+        for stats in UserStats.objects.select_related('user').order_by(
+            '-followers_count'
+        )[:options['profiles']]:
+            feeds.append((
+                reverse('posts:profile', args=[stats.user.username]),
+                stats.user.posts.all(),
+            ))
+        urls = []
+        images = set()
+        for url, posts in feeds:
+            feed_urls, shown = feed_pages(url, posts, pages)
+            urls.extend(feed_urls)
+            images.update(post.image.name for post in shown if post.image)
+        return urls, sorted(images)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        urls, images = self.collect(options)
+        # миниатюры первыми: иначе страницы закэшируются с заглушками
+        tasks = [(warm_thumbnail, image) for image in images]
+        tasks += [(warm_page, url) for url in urls]
+        budget = options['timeout'] - (time.monotonic() - started)
+        done, errors, not_done = run_tasks(
+            tasks, options['concurrency'], max(budget, 0)
+        )
+        for error in errors:
+            self.stderr.write(str(error))
+        self.stdout.write(
+            f'Страниц: {len(urls)}, миниатюр: {len(images)}, '
+            f'готово: {done}, ошибок: {len(errors)}, '
+            f'не успели: {not_done}'
+        )
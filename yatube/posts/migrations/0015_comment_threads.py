@@ -0,0 +1,58 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+PATH_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+PATH_STEP = 7
+PATH_MAX_ID = len(PATH_DIGITS) ** PATH_STEP - 1
+
+
+def path_segment(number):
+    digits = []
+    for _ in range(PATH_STEP):
+        number, digit = divmod(number, len(PATH_DIGITS))
+        digits.append(PATH_DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def fill_paths(apps, schema_editor):
+    # до миграции ответов не было: все комментарии — верхнего уровня
+    Comment = apps.get_model('posts', 'Comment')
+    batch = []
+    for comment in Comment.objects.only('pk').iterator():
+        comment.path = path_segment(PATH_MAX_ID - comment.pk)
+        batch.append(comment)
+        if len(batch) == 1000:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_comment_page_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=252),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_feed_length(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    UserStats.objects.update(feed_length=Coalesce(
+        Subquery(
+            FeedItem.objects.filter(
+                user=OuterRef('pk')
+            ).order_by().values('user').annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_length',
+            field=models.PositiveIntegerField(default=0, verbose_name='записей в ленте'),
+        ),
+        migrations.RunPython(fill_feed_length, migrations.RunPython.noop),
+    ]
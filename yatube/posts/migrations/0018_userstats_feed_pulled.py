@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    # посты нынешних крупных авторов по лентам не раскладывались
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gt=settings.FEED_PULL_THRESHOLD
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_userstats_feed_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_pulled',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='посты читаются в ленту'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
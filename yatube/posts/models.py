@@ -1,18 +1,64 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
+from core.storages import ContentAddressedStorage
+
+from . import images
+
 User = get_user_model()
 
+# материализованный путь комментария: по PATH_STEP цифр base36 на уровень
+PATH_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+PATH_STEP = 7
+PATH_LENGTH = 252
+PATH_MAX_ID = len(PATH_DIGITS) ** PATH_STEP - 1
+# больше любой цифры пути: [path, path + PATH_END) — вся ветка
+PATH_END = '~'
+
+
+def path_segment(number):
+    """Число в виде PATH_STEP цифр base36, сравнимых как строки."""
+    digits = []
+    for _ in range(PATH_STEP):
+        number, digit = divmod(number, len(PATH_DIGITS))
+        digits.append(PATH_DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def exclude_counters(instance, kwargs, counters):
+    """Не даёт обычному save() перезаписать счётчики устаревшими значениями.
+
+    Счётчики меняются UPDATE'ами в обход объекта, поэтому при
+    сохранении уже существующей строки они исключаются из update_fields.
+    """
+    if instance._state.adding or kwargs.get('update_fields') is not None:
+        return
+    if kwargs.get('force_insert'):
+        return
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in counters
+    ]
+
 
 class Group(models.Model):
     """Модель групп"""
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'число постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        exclude_counters(self, kwargs, ('posts_count',))
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Группа'
         verbose_name_plural = 'Группы'
@@ -28,6 +74,10 @@ class Post(models.Model):
         verbose_name='дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name='дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -43,29 +93,100 @@ class Post(models.Model):
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост'
     )
+    # одинаковые картинки хранятся одним файлом
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'число комментариев',
+        default=0,
+        editable=False
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # группа на момент загрузки: нужна, чтобы перенести счётчик
+        # постов при смене группы
+        self._loaded_group_id = self.group_id
+        # имя картинки на момент загрузки: при замене освобождается
+        # ссылка на старый файл
+        self._loaded_image = self._image_name()
 
     def __str__(self):
         return self.text[:15]
 
+    def _image_name(self):
+        # без обращения к дескриптору: у отложенного поля он
+        # загрузил бы значение отдельным запросом
+        image = self.__dict__.get('image')
+        return getattr(image, 'name', image) or ''
+
+    def save(self, *args, **kwargs):
+        exclude_counters(self, kwargs, ('comments_count',))
+        # новая загрузка берёт ссылку на файл, даже если он совпал
+        # со старым по содержимому: в post_save старая освобождается
+        self._image_uploaded = bool(self.image) and not self.image._committed
+        if self._image_uploaded:
+            # хранится уменьшенной и без метаданных
+            normalized = images.normalize(self.image)
+            if normalized is not None:
+                self.image = normalized
+        # счётчики обновляются в post_save в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_group_id = self.group_id
+        self._loaded_image = self._image_name()
+
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # id в конце индексов — уникальный ключ курсорной пагинации,
+        # с ним выборка страницы обходится без сортировки
+        indexes = (
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+        )
 
 
 class Comment(models.Model):
-    """Модель коментариев"""
+    """Модель коментариев
+
+    Ответы образуют дерево. path — id предков и самого комментария,
+    по PATH_STEP символов на уровень, поэтому сортировка по path даёт
+    порядок обхода ветки, а ветка целиком — это диапазон path.
+    Комментарии верхнего уровня кодируются как PATH_MAX_ID - id:
+    новые ветки идут первыми, ответы внутри ветки — по порядку.
+    """
+    MAX_DEPTH = PATH_LENGTH // PATH_STEP - 1
+
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
         related_name="post",
         verbose_name="Публикация"
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies',
+        verbose_name='Ответ на'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -78,11 +199,58 @@ class Comment(models.Model):
     created = models.DateTimeField(
         'Дата создания',
         auto_now_add=True)
+    path = models.CharField(max_length=PATH_LENGTH, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        if self.parent is not None and self.parent.depth >= self.MAX_DEPTH:
+            # дальше путь не помещается: ответ встаёт рядом с родителем
+            self.parent = self.parent.parent
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not self.path:
+                self.depth, self.path = self.tree_position()
+                Comment.objects.filter(pk=self.pk).update(
+                    depth=self.depth, path=self.path
+                )
+
+    def tree_position(self):
+        """(глубина, путь) сохранённого комментария."""
+        if self.parent is None:
+            return 0, path_segment(PATH_MAX_ID - self.pk)
+        return (
+            self.parent.depth + 1,
+            self.parent.path + path_segment(self.pk),
+        )
+
+    def descendants(self, depth=None):
+        """Ответы на всю глубину или на depth уровней, в порядке ветки.
+
+        Один запрос по диапазону path, без рекурсии по уровням.
+        """
+        replies = Comment.objects.filter(
+            post_id=self.post_id,
+            path__gt=self.path,
+            path__lt=self.path + PATH_END,
+        )
+        if depth is not None:
+            replies = replies.filter(depth__lte=self.depth + depth)
+        return replies.order_by('path')
 
     class Meta:
         ordering = ['-created']
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = (
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_id_idx'
+            ),
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text
@@ -100,6 +268,10 @@ class Follow(models.Model):
         on_delete=models.CASCADE
     )
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         constraints = (
             models.UniqueConstraint(
@@ -107,3 +279,134 @@ class Follow(models.Model):
                 name='unique_users'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами при создании и удалении постов и подписок;
+    расхождения исправляет команда recount. По follows_changed
+    и suggestions_updated команда suggest_authors находит пользователей,
+    которым нужно пересчитать рекомендации.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'число подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.PositiveIntegerField('число подписок', default=0)
+    # может быть завышено, но не занижено: по нему находятся ленты
+    # длиннее FEED_INBOX_LENGTH, а обрезка выставляет точную длину
+    feed_length = models.PositiveIntegerField('записей в ленте', default=0)
+    # посты автора, не разложенные по лентам: их читают при запросе,
+    # пока feed.settle не разложит их после ухода автора из крупных
+    feed_pulled = models.BooleanField(
+        'посты читаются в ленту',
+        default=False,
+        db_index=True
+    )
+    follows_changed = models.DateTimeField(
+        'подписки изменены',
+        null=True,
+        blank=True
+    )
+    suggestions_updated = models.DateTimeField(
+        'рекомендации пересчитаны',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FeedItem(models.Model):
+    """Запись в ленте подписок пользователя.
+
+    Лента заполняется при публикации поста (fan-out on write),
+    поэтому страница подписок читается одним диапазоном по индексу
+    (user, -pub_date, -post) без join'а Follow и Post.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Публикация'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_item'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_post_idx'
+            ),
+        )
+
+
+class Suggestion(models.Model):
+    """Автор, предложенный пользователю в блоке «Кого почитать».
+
+    На пользователя хранится не больше SUGGESTIONS_PER_USER строк,
+    rank — место от нуля. Таблицу заполняет команда suggest_authors.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'rank'],
+                name='unique_suggestion_rank'
+            ),
+        )
@@ -0,0 +1,307 @@
+import base64
+import binascii
+import datetime
+import heapq
+import json
+from collections.abc import Sequence
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# число строк таблицы по статистике СУБД
+TABLE_ESTIMATE_SQL = {
+    'postgresql': 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+    'mysql': (
+        'SELECT table_rows FROM information_schema.tables '
+        'WHERE table_schema = DATABASE() AND table_name = %s'
+    ),
+    # первое число stat — строк в таблице; sqlite_stat1 заполняет ANALYZE
+    'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+}
+
+
+def _json_default(value):
+    # DjangoJSONEncoder обрезает микросекунды, а ключу нужна точность.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class InvalidCursor(Exception):
+    """Курсор повреждён или не относится к этой выборке."""
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации.
+
+    Повторяет интерфейс django.core.paginator.Page настолько,
+    насколько это нужно шаблонам: итерация, len и has_* методы.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация без OFFSET и COUNT(*).
+
+    Страница выбирается условием по ключу сортировки относительно
+    последней (after) или первой (before) записи соседней страницы,
+    поэтому стоимость запроса не зависит от глубины страницы.
+    Ключ должен быть уникальным, поэтому последним полем идёт id.
+    transform позволяет отдавать в шаблон не сами строки выборки,
+    а связанные с ними объекты (например, посты записей ленты).
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 transform=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+        self.transform = transform
+
+    def key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def encode_values(self, values):
+        raw = json.dumps(values, default=_json_default).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def encode_cursor(self, obj):
+        return self.encode_values(self.key(obj))
+
+    def decode_values(self, cursor):
+        """Значения ключа из курсора, ещё без приведения типов."""
+        padded = cursor + '=' * (-len(cursor) % 4)
+        try:
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return values
+
+    def decode_cursor(self, cursor):
+        values = self.decode_values(cursor)
+        model = self.object_list.model
+        try:
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            # курсор можно собрать вручную: {} или [] вместо даты
+            raise InvalidCursor(cursor)
+        if None in values:
+            raise InvalidCursor(cursor)
+        return values
+
+    def _filter(self, values, reverse):
+        """Условие «строго после ключа» для лексикографического порядка."""
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            name = self.fields[position]
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for prev_name, prev_value in zip(self.fields, values[:position]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def window(self, after=None, before=None):
+        """Выборка за курсором, отсортированная в порядке обхода.
+
+        Для before порядок обратный: строки идут от курсора к началу.
+        """
+        queryset = self.object_list
+        if before is not None:
+            return queryset.filter(
+                self._filter(self.decode_cursor(before), reverse=True)
+            ).order_by(*self._reversed_ordering())
+        if after is not None:
+            queryset = queryset.filter(
+                self._filter(self.decode_cursor(after), reverse=False)
+            )
+        return queryset.order_by(*self.ordering)
+
+    def _make_page(self, keyed_rows, after, before):
+        """Собирает страницу из (ключ, объект) в порядке обхода."""
+        reverse = before is not None
+        has_more = len(keyed_rows) > self.per_page
+        keyed_rows = keyed_rows[:self.per_page]
+        if reverse:
+            keyed_rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after is not None
+        next_cursor = previous_cursor = None
+        if keyed_rows and has_next:
+            next_cursor = self.encode_values(keyed_rows[-1][0])
+        if keyed_rows and has_previous:
+            previous_cursor = self.encode_values(keyed_rows[0][0])
+        return CursorPage(
+            [row for key, row in keyed_rows],
+            self,
+            next_cursor,
+            previous_cursor,
+        )
+
+    def _transformed(self, row):
+        return self.transform(row) if self.transform else row
+
+    def page(self, after=None, before=None):
+        rows = self.window(after, before)[:self.per_page + 1]
+        return self._make_page(
+            [(self.key(row), self._transformed(row)) for row in rows],
+            after,
+            before,
+        )
+
+    def get_page(self, after=None, before=None):
+        """Как page(), но с битым курсором возвращает первую страницу."""
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Keyset-пагинация по нескольким выборкам с одинаковым ключом.
+
+    Каждая выборка читается окном не длиннее страницы, окна сливаются
+    потоково (k-way merge через heapq.merge), одинаковые ключи
+    схлопываются. Все выборки должны сортироваться по убыванию ключа.
+    """
+
+    def __init__(self, paginators, per_page):
+        self.paginators = paginators
+        self.per_page = int(per_page)
+        self.fields = paginators[0].fields
+
+    def decode_cursor(self, cursor):
+        # проверка формата; значения каждая выборка разбирает сама
+        return self.paginators[0].decode_cursor(cursor)
+
+    def _stream(self, paginator, after, before):
+        rows = paginator.window(after, before)[:self.per_page + 1]
+        for row in rows.iterator():
+            yield paginator.key(row), paginator._transformed(row)
+
+    def page(self, after=None, before=None):
+        for cursor in (after, before):
+            if cursor is not None:
+                self.decode_cursor(cursor)
+        merged = heapq.merge(
+            *(self._stream(p, after, before) for p in self.paginators),
+            key=itemgetter(0),
+            reverse=before is None,
+        )
+        keyed_rows = []
+        last_key = None
+        for key, row in merged:
+            if key == last_key:
+                continue
+            last_key = key
+            keyed_rows.append((key, row))
+            if len(keyed_rows) > self.per_page:
+                break
+        return self._make_page(keyed_rows, after, before)
+
+
+def _table_estimate(model, using):
+    """Оценка числа строк таблицы модели по статистике СУБД или None."""
+    connection = connections[using]
+    sql = TABLE_ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(sql, [model._meta.db_table])
+        except DatabaseError:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    value = row[0]
+    if isinstance(value, str):
+        value = value.split()[0]
+    return int(float(value))
+
+
+def estimate_count(queryset, limit=None):
+    """Число строк выборки без полного COUNT(*).
+
+    Для выборки без фильтров берётся оценка из статистики СУБД, если
+    она не меньше limit. Иначе строки считаются, но не дальше limit:
+    для больших выборок результат — это limit, нижняя граница.
+    """
+    if limit is None:
+        limit = settings.ESTIMATED_COUNT_LIMIT
+    if not queryset.query.where:
+        estimate = _table_estimate(queryset.model, queryset.db)
+        if estimate is not None and estimate >= limit:
+            return estimate
+    return queryset[:limit].count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Нумерованные страницы с оценкой числа строк вместо COUNT(*).
+
+    Страницы дальше ESTIMATED_COUNT_LIMIT строк недоступны.
+    """
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+def paginate(request, object_list, per_page, ordering=('-pub_date', '-id')):
+    """Страница выборки по параметрам запроса.
+
+    По умолчанию используется курсорная пагинация (?after= / ?before=).
+    Нумерованные страницы (?page=) остаются запасным вариантом
+    для старых ссылок: они требуют OFFSET и COUNT(*).
+    """
+    if 'page' in request.GET:
+        paginator = Paginator(object_list.order_by(*ordering), per_page)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(object_list, per_page, ordering)
+    return paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
@@ -0,0 +1,199 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_fts хранит только инвертированный индекс текста
+(external content), сами тексты читаются из posts_post. Триггеры
+на posts_post обновляют индекс при вставке, изменении текста и
+удалении поста, в том числе каскадном. Миграция SQLite пересоздаёт
+таблицу при изменении её полей и теряет триггеры, поэтому после
+таких миграций нужна команда rebuild_search; проверка
+posts.E001 (manage.py check --tag database, migrate) сообщает
+о потерянных триггерах.
+
+На других СУБД поиск работает через icontains, без ранжирования.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginator import CursorPaginator, InvalidCursor
+
+FTS_TABLE = 'posts_post_fts'
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+                VALUES ('delete', old.id, old.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+                VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+        END""",
+]
+TRIGGERS = [
+    f'{FTS_TABLE}_insert',
+    f'{FTS_TABLE}_delete',
+    f'{FTS_TABLE}_update',
+]
+UNINSTALL_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+# маркеры подсветки: в тексте их нет, после экранирования HTML
+# они заменяются на <mark>
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 24
+
+WORD = re.compile(r'\w+')
+
+
+def supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection):
+    """Создаёт индекс и триггеры, если их нет, и перестраивает индекс."""
+    if not supported(using):
+        return
+    with using.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def uninstall(using=connection):
+    if not supported(using):
+        return
+    with using.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def missing_objects(using=connection):
+    """Имена таблицы индекса и триггеров, которых нет в базе."""
+    if not supported(using):
+        return []
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+        )
+        existing = {name for name, in cursor.fetchall()}
+    return [
+        name for name in [FTS_TABLE, *TRIGGERS] if name not in existing
+    ]
+
+
+def match_expression(query):
+    """Запрос пользователя в виде выражения FTS5.
+
+    Синтаксис FTS5 пользователю не доступен: каждое слово берётся
+    в кавычки как префикс, все слова должны встретиться.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по релевантности.
+
+    Ключ страницы — (bm25, id поста): чем меньше bm25, тем выше пост.
+    У постов на странице есть атрибут snippet — фрагмент текста
+    с подсвеченными совпадениями.
+    """
+
+    def __init__(self, query, per_page):
+        super().__init__(
+            Post.objects.select_related('author', 'group'),
+            per_page,
+            ordering=('rank', 'id'),
+        )
+        self.expression = match_expression(query)
+
+    def decode_cursor(self, cursor):
+        rank, post_id = self.decode_values(cursor)
+        if not isinstance(rank, (int, float)) or not isinstance(post_id, int):
+            raise InvalidCursor(cursor)
+        return [float(rank), post_id]
+
+    def window(self, after=None, before=None):
+        """(bm25, id, фрагмент) найденных постов в порядке обхода."""
+        sql = f"""
+            SELECT rank, id, snippet FROM (
+                SELECT
+                    bm25({FTS_TABLE}) AS rank,
+                    rowid AS id,
+                    snippet({FTS_TABLE}, 0, %s, %s, '…', %s) AS snippet
+                FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH %s
+            )
+        """
+        params = [MARK_START, MARK_END, SNIPPET_TOKENS, self.expression]
+        cursor, order = None, 'ASC'
+        if after is not None:
+            cursor, comparison = self.decode_cursor(after), '>'
+        if before is not None:
+            cursor, comparison = self.decode_cursor(before), '<'
+            order = 'DESC'
+        if cursor is not None:
+            sql += f' WHERE (rank, id) {comparison} (%s, %s)'
+            params += cursor
+        sql += f' ORDER BY rank {order}, id {order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            return db_cursor.fetchall()
+
+    def page(self, after=None, before=None):
+        if not self.expression:
+            return self._make_page([], None, None)
+        if not supported():
+            return self._fallback_page(after, before)
+        rows = self.window(after, before)
+        posts = self.object_list.in_bulk([post_id for _, post_id, _ in rows])
+        keyed_rows = []
+        for rank, post_id, snippet in rows:
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.snippet = highlight(snippet)
+            keyed_rows.append(([rank, post_id], post))
+        return self._make_page(keyed_rows, after, before)
+
+    def _fallback_page(self, after, before):
+        queryset = self.object_list
+        for word in WORD.findall(self.expression):
+            queryset = queryset.filter(text__icontains=word)
+        page = CursorPaginator(queryset, self.per_page).get_page(
+            after=after, before=before
+        )
+        for post in page:
+            post.snippet = post.text
+        return page
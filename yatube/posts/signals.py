@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, feed, follows, suggestions, thumbnails
+from .caching import author_scope, bump, bump_post, group_scope, post_scope
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Сбрасывает кэш лент; новый пост ещё и раскладывается по лентам."""
+    if raw:
+        return
+    bump_post(instance, getattr(instance, '_loaded_group_id', None))
+    if instance.image:
+        thumbnails.schedule_on_commit(instance.image.name)
+    old_image = getattr(instance, '_loaded_image', '')
+    uploaded = getattr(instance, '_image_uploaded', False)
+    if old_image and (uploaded or old_image != instance.image.name):
+        thumbnails.release_on_commit(old_image)
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        if instance.group_id:
+            counters.change(
+                Group.objects.filter(pk=instance.group_id), 'posts_count', 1
+            )
+        feed.fan_out(instance)
+        return
+    old_group_id = getattr(instance, '_loaded_group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        if old_group_id:
+            counters.change(
+                Group.objects.filter(pk=old_group_id), 'posts_count', -1
+            )
+        if instance.group_id:
+            counters.change(
+                Group.objects.filter(pk=instance.group_id), 'posts_count', 1
+            )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_post(instance)
+    if instance.image:
+        thumbnails.release_on_commit(instance.image.name)
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    if instance.group_id:
+        counters.change(
+            Group.objects.filter(pk=instance.group_id), 'posts_count', -1
+        )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    bump(post_scope(instance.post_id))
+    if created:
+        counters.change(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump(post_scope(instance.post_id))
+    counters.change(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(author_scope(instance.author_id), author_scope(instance.user_id))
+        follows.forget(instance.user_id)
+        suggestions.mark_changed(instance.user_id)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        counters.change_user(instance.user_id, 'following_count', 1)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump(author_scope(instance.author_id), author_scope(instance.user_id))
+    follows.forget(instance.user_id)
+    suggestions.mark_changed(instance.user_id)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    counters.change_user(instance.user_id, 'following_count', -1)
+    feed.drop_author(instance.user_id, instance.author_id)
@@ -0,0 +1,139 @@
+"""Рекомендации «Кого почитать», посчитанные заранее.
+
+Кандидаты для пользователя — авторы, на которых подписаны его
+подписки (второй круг), и авторы, писавшие в те же группы, что и он.
+Автор получает SECOND_DEGREE_WEIGHT очков за каждую подписку, которая
+к нему ведёт, и CO_POSTING_WEIGHT за каждую общую группу. Лучшие
+SUGGESTIONS_PER_USER сохраняются в Suggestion командой suggest_authors,
+а страница читает их одним запросом по индексу (user, rank).
+
+Подписка и отписка отмечают пользователя в UserStats.follows_changed.
+Его рекомендации и рекомендации его подписчиков устаревают, и
+инкрементальный запуск пересчитывает только их. Общие группы меняются
+с новыми постами и обновляются полным пересчётом.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .caching import bump, suggestions_scope
+from .follows import following_ids
+from .models import Follow, Post, Suggestion, UserStats
+
+SECOND_DEGREE_WEIGHT = 1.0
+CO_POSTING_WEIGHT = 0.5
+
+
+def mark_changed(user_id):
+    """Отмечает, что подписки пользователя изменились."""
+    UserStats.objects.filter(pk=user_id).update(
+        follows_changed=timezone.now()
+    )
+
+
+def second_degree(user_ids):
+    """{пользователь: Counter(автор: число подписок, ведущих к нему)}."""
+    paths = defaultdict(Counter)
+    rows = Follow.objects.filter(
+        user__following__user_id__in=user_ids
+    ).values_list('user__following__user_id', 'author_id').annotate(
+        paths=Count('id')
+    ).order_by()
+    for user_id, author_id, count in rows.iterator():
+        paths[user_id][author_id] = count
+    return paths
+
+
+def co_posting(user_ids):
+    """{пользователь: Counter(автор: число общих групп)}."""
+    members = defaultdict(set)
+    for user_id, group_id in Post.objects.filter(
+        author_id__in=user_ids, group__isnull=False
+    ).values_list('author_id', 'group_id').distinct().order_by():
+        members[group_id].add(user_id)
+    shared = defaultdict(Counter)
+    if not members:
+        return shared
+    for group_id, author_id in Post.objects.filter(
+        group_id__in=members
+    ).values_list('group_id', 'author_id').distinct().order_by().iterator():
+        for user_id in members[group_id]:
+            shared[user_id][author_id] += 1
+    return shared
+
+
+def compute(user_ids, limit):
+    """{пользователь: id лучших авторов по убыванию очков} для пачки."""
+    following = defaultdict(set)
+    for user_id, author_id in Follow.objects.filter(
+        user_id__in=user_ids
+    ).values_list('user_id', 'author_id'):
+        following[user_id].add(author_id)
+    paths = second_degree(user_ids)
+    shared = co_posting(user_ids)
+    suggested = {}
+    for user_id in user_ids:
+        scores = defaultdict(float)
+        for author_id, count in paths[user_id].items():
+            scores[author_id] += count * SECOND_DEGREE_WEIGHT
+        for author_id, count in shared[user_id].items():
+            scores[author_id] += count * CO_POSTING_WEIGHT
+        exclude = following[user_id] | {user_id}
+        best = heapq.nlargest(
+            limit,
+            (item for item in scores.items() if item[0] not in exclude),
+            # при равных очках — более ранние авторы
+            key=lambda item: (item[1], -item[0]),
+        )
+        suggested[user_id] = [author_id for author_id, _ in best]
+    return suggested
+
+
+def store(suggested, computed_at):
+    """Заменяет рекомендации пачки пользователей."""
+    with transaction.atomic():
+        Suggestion.objects.filter(user_id__in=suggested).delete()
+        Suggestion.objects.bulk_create([
+            Suggestion(user_id=user_id, author_id=author_id, rank=rank)
+            for user_id, author_ids in suggested.items()
+            for rank, author_id in enumerate(author_ids)
+        ])
+        UserStats.objects.filter(pk__in=suggested).update(
+            suggestions_updated=computed_at
+        )
+        bump(*[suggestions_scope(user_id) for user_id in suggested])
+
+
+def stale_user_ids():
+    """Пользователи, рекомендации которых устарели.
+
+    Это те, кто менял подписки после своего пересчёта или ещё
+    не пересчитывался, и их подписчики.
+    """
+    changed = set(UserStats.objects.filter(
+        Q(suggestions_updated__isnull=True)
+        | Q(follows_changed__gt=F('suggestions_updated'))
+    ).values_list('user_id', flat=True).iterator())
+    followers = set(Follow.objects.filter(
+        author_id__in=changed
+    ).values_list('user_id', flat=True).iterator()) if changed else set()
+    return sorted(changed | followers)
+
+
+def suggested_authors(user, count):
+    """До count рекомендованных авторов, на которых user ещё не подписан.
+
+    Рекомендации читаются одним запросом по индексу (user, rank);
+    подписки после пересчёта отсекаются по кэшу графа подписок.
+    """
+    followed = following_ids(user.pk)
+    suggestions = Suggestion.objects.filter(user=user).select_related(
+        'author'
+    ).order_by('rank')
+    return [
+        suggestion.author for suggestion in suggestions
+        if suggestion.author_id not in followed
+    ][:count]
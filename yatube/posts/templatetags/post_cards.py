@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Library
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .. import thumbnails
+
+register = Library()
+
+CARD_PREFIX = 'post-card:'
+CARD_SEPARATOR = '<hr>'
+
+
+def card_key(post, show_author, show_group):
+    """Ключ карточки: меняется при любом сохранении поста."""
+    return (
+        f'{CARD_PREFIX}{post.pk}:{post.updated.timestamp()}:'
+        f'{int(show_author)}{int(show_group)}'
+    )
+
+
+@register.simple_tag
+def post_cards(posts, show_author=True, show_group=True):
+    """Карточки постов страницы из кэша фрагментов.
+
+    Все карточки запрашиваются одним get_many, отрисовываются только
+    отсутствующие в кэше, и они же сохраняются одним set_many.
+    Миниатюры для отрисовываемых карточек читаются заранее, одним
+    обращением к хранилищу sorl.
+    """
+    posts = list(posts)
+    keys = [card_key(post, show_author, show_group) for post in posts]
+    cards = cache.get_many(keys)
+    to_render = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    prefetched = thumbnails.prefetch(post.image for _, post in to_render)
+    missing = {}
+    for key, post in to_render:
+        missing[key] = render_to_string('includes/post_card.html', {
+            'post': post,
+            'show_author': show_author,
+            'show_group': show_group,
+            'thumbnails': prefetched,
+        })
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return mark_safe(CARD_SEPARATOR.join(cards[key] for key in keys))
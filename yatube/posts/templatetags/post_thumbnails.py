@@ -0,0 +1,31 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+def srcset(variants):
+    return ', '.join(f'{variant.url} {width}w' for variant, width in variants)
+
+
+@register.inclusion_tag('includes/post_image.html', takes_context=True)
+def post_image(context, image, spec='card', css_class='card-img my-2',
+               sizes='(max-width: 960px) 100vw, 960px'):
+    """<img> с вариантами миниатюры в srcset и ленивой загрузкой.
+
+    Браузер сам выбирает наименьший вариант, подходящий по sizes,
+    и WebP, если умеет его показывать.
+    """
+    if not image:
+        return {'image': None}
+    thumbnail, variants, webp_variants = thumbnails.responsive(
+        image, spec, context.get('thumbnails')
+    )
+    return {
+        'image': thumbnail,
+        'srcset': srcset(variants),
+        'webp_srcset': srcset(webp_variants),
+        'sizes': sizes,
+        'css_class': css_class,
+    }
@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..models import Comment, Group, Post
+from ..paginator import estimate_count
+
+User = get_user_model()
+
+
+class AdminChangeListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='someone_else')
+        cls.group = Group.objects.create(title='группа', slug='group')
+        cls.post = Post.objects.create(
+            text='первый пост', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        self.admin_client = Client()
+        self.admin_client.force_login(AdminChangeListTests.admin)
+        cache.clear()
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for n in range(start, start + count):
+            author = User.objects.create_user(username=f'user{n}')
+            group = Group.objects.create(title=f'г{n}', slug=f'g{n}')
+            post = Post.objects.create(
+                text=f'пост {n}', author=author, group=group
+            )
+            Comment.objects.create(post=post, author=author, text=f'к {n}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_budget_does_not_grow(self):
+        urls = [
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_post_changelist') + '?author__id__exact=2',
+        ]
+        self.add_rows(2)
+        before = [self.count_queries(url) for url in urls]
+        self.add_rows(20)
+        for url, expected in zip(urls, before):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected)
+
+    def test_keyset_pages(self):
+        self.add_rows(4)
+        url = reverse('admin:posts_post_changelist')
+        seen = []
+        with mock.patch.object(PostAdmin, 'list_per_page', 2):
+            while url:
+                response = self.admin_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                cl = response.context['cl']
+                seen.extend(post.pk for post in cl.result_list)
+                url = cl.next_url and reverse(
+                    'admin:posts_post_changelist'
+                ) + cl.next_url
+        self.assertEqual(
+            seen, list(Post.objects.values_list('pk', flat=True))
+        )
+
+    def test_broken_cursor(self):
+        response = self.admin_client.get(
+            reverse('admin:posts_comment_changelist') + '?after=oops'
+        )
+        self.assertRedirects(
+            response,
+            reverse('admin:posts_comment_changelist') + '?e=1',
+            fetch_redirect_response=False,
+        )
+
+    def test_autocomplete_filter(self):
+        user = AdminChangeListTests.user
+        response = self.admin_client.get(
+            reverse('admin:posts_post_changelist'),
+            {'author__id__exact': user.pk},
+        )
+        self.assertContains(response, 'data-ajax--url')
+        self.assertContains(response, f'<option value="{user.pk}" selected>')
+        self.assertNotContains(response, 'someone_else')
+
+    def test_estimated_count(self):
+        self.add_rows(3)
+        self.assertEqual(estimate_count(Post.objects.all(), limit=2), 2)
+        self.assertEqual(estimate_count(Post.objects.all(), limit=10), 4)
+        with self.settings(ESTIMATED_COUNT_LIMIT=2):
+            response = self.admin_client.get(
+                reverse('admin:posts_comment_changelist')
+            )
+        self.assertContains(response, 'около 2')
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_list_editable_uses_row_labels(self):
+        group = AdminChangeListTests.group
+        response = self.admin_client.get(
+            reverse('admin:posts_post_changelist')
+        )
+        self.assertContains(
+            response, f'<option value="{group.pk}" selected>группа</option>'
+        )
+
+    def test_rows_read_once(self):
+        self.add_rows(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(
+                reverse('admin:posts_post_changelist')
+            )
+        rows = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT "posts_post"."id"')
+        ]
+        self.assertEqual(len(rows), 1, rows)
+        self.assertIn('INNER JOIN "auth_user"', rows[0])
+        self.assertEqual(len(response.context['cl'].formset.forms), 4)
@@ -0,0 +1,177 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import caching
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='группа', slug='group')
+        cls.other_group = Group.objects.create(title='другая', slug='other')
+        cls.post = Post.objects.create(
+            text='первый пост',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_index_is_cached(self):
+        url = reverse('posts:index')
+        content = self.guest_client.get(url).content
+        Post.objects.filter(pk=FeedCacheTests.post.pk).update(text='мимо')
+        self.assertEqual(self.guest_client.get(url).content, content)
+
+    def test_new_post_resets_feeds(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=['group']),
+            reverse('posts:profile', args=['auth']),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            text='свежий пост',
+            author=FeedCacheTests.user,
+            group=FeedCacheTests.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'свежий пост')
+
+    def test_unrelated_group_stays_cached(self):
+        url = reverse('posts:group_list', args=['other'])
+        self.guest_client.get(url)
+        with self.assertNumQueries(1):
+            self.guest_client.get(url)
+        Post.objects.create(
+            text='свежий пост',
+            author=FeedCacheTests.user,
+            group=FeedCacheTests.group,
+        )
+        with self.assertNumQueries(1):
+            self.guest_client.get(url)
+
+    def test_comment_resets_post_detail(self):
+        url = reverse('posts:post_detail', args=[FeedCacheTests.post.pk])
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=FeedCacheTests.post,
+            author=FeedCacheTests.user,
+            text='новый комментарий',
+        )
+        self.assertContains(self.guest_client.get(url), 'новый комментарий')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='текст карточки', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_card_is_reused_until_post_changes(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.filter(pk=PostCardCacheTests.post.pk).update(
+            text='текст без сохранения'
+        )
+        Post.objects.create(text='другой пост', author=PostCardCacheTests.user)
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'другой пост')
+        self.assertContains(response, 'текст карточки')
+        post = Post.objects.get(pk=PostCardCacheTests.post.pk)
+        post.text = 'исправленный текст'
+        post.save()
+        self.assertContains(self.guest_client.get(url), 'исправленный текст')
+
+    def test_profile_card_hides_author(self):
+        response = self.guest_client.get(
+            reverse('posts:profile', args=['auth'])
+        )
+        self.assertNotContains(response, 'Об авторе.')
+        self.assertContains(
+            self.guest_client.get(reverse('posts:index')),
+            'Об авторе.'
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text='пост', author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTests.reader)
+        cache.clear()
+
+    def test_index_not_modified(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='новый', author=ConditionalGetTests.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail_last_modified(self):
+        url = reverse('posts:post_detail', args=[ConditionalGetTests.post.pk])
+        comment = Comment.objects.create(
+            post=ConditionalGetTests.post,
+            author=ConditionalGetTests.reader,
+            text='комментарий',
+        )
+        # версии сброшены и прочитаны 10 секунд назад
+        with mock.patch.object(caching, 'time') as clock:
+            clock.time.return_value = time.time() - 10
+            cache.clear()
+            last_modified = self.guest_client.get(url)['Last-Modified']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, 304)
+        # удаление самого нового комментария не уводит дату назад
+        comment.delete()
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+    def test_follow_index_not_modified(self):
+        url = reverse('posts:follow_index')
+        etag = self.reader_client.get(url)['ETag']
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        other_client = Client()
+        other_client.force_login(ConditionalGetTests.author)
+        self.assertNotEqual(other_client.get(url)['ETag'], etag)
+        Post.objects.filter(pk=ConditionalGetTests.post.pk).first().save()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,247 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from .. import suggestions, thumbnails
+from ..models import (
+    FeedItem, Follow, Group, Post, Suggestion, UserStats
+)
+from .test_thumbnails import SMALL_GIF
+
+User = get_user_model()
+
+
+class HeavyAuthorsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        for n in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'reader{n}'),
+                author=cls.author,
+            )
+
+    def test_heavy_authors(self):
+        out = StringIO()
+        call_command('heavy_authors', threshold=2, stdout=out)
+        self.assertIn('author\t3', out.getvalue())
+        out = StringIO()
+        call_command('heavy_authors', threshold=3, stdout=out)
+        self.assertNotIn('author\t', out.getvalue())
+
+    def test_settle(self):
+        cache.clear()
+        with override_settings(FEED_PULL_THRESHOLD=2):
+            Post.objects.create(text='пост', author=self.author)
+        self.assertFalse(FeedItem.objects.exists())
+        cache.clear()
+        out = StringIO()
+        call_command('heavy_authors', settle=True, stdout=out)
+        self.assertIn('Разложено авторов: 1', out.getvalue())
+        self.assertEqual(FeedItem.objects.count(), 3)
+
+
+class RecountCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='группа', slug='group')
+        Post.objects.create(text='пост', author=cls.user, group=cls.group)
+
+    def test_recount_repairs_drift(self):
+        UserStats.objects.filter(user=RecountCommandTests.user).update(
+            posts_count=7
+        )
+        Group.objects.update(posts_count=0)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('user.posts_count: исправлено строк 1', out.getvalue())
+        self.assertEqual(
+            UserStats.objects.get(user=RecountCommandTests.user).posts_count,
+            1
+        )
+        self.assertEqual(Group.objects.get().posts_count, 1)
+
+
+class WarmCacheCommandTests(TransactionTestCase):
+    # страницы отрисовываются в потоках со своими соединениями:
+    # данные теста должны быть закоммичены
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='группа', slug='group')
+        for n in range(15):
+            Post.objects.create(
+                text=f'пост {n}',
+                author=author,
+                group=group,
+            )
+        cache.clear()
+
+    def test_warm_cache(self):
+        out = StringIO()
+        call_command('warm_cache', pages=2, stdout=out)
+        self.assertIn('Страниц: 6', out.getvalue())
+        self.assertIn('готово: 6, ошибок: 0', out.getvalue())
+        with self.assertNumQueries(0):
+            response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'пост 14')
+
+    def test_warmed_page_matches_live(self):
+        url = reverse('posts:profile', args=['author'])
+        live = Client().get(url).content
+        cache.clear()
+        call_command('warm_cache', pages=1, stdout=StringIO())
+        # из кэша: читается только автор
+        with self.assertNumQueries(1):
+            warmed = Client().get(url).content
+        self.assertEqual(warmed, live)
+
+    def test_timeout(self):
+        out = StringIO()
+        call_command('warm_cache', pages=2, timeout=0, stdout=out)
+        self.assertIn('готово: 0, ошибок: 0, не успели: 6', out.getvalue())
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class GcMediaCommandTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        cache.clear()
+        self.post = Post.objects.create(
+            text='пост',
+            author=User.objects.create_user(username='author'),
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        thumbnails.generate(self.post.image.name)
+        self.kept = self.media_names()
+        self.orphans = ['posts/orphan.gif', 'cache/ab/cd/orphan.jpg']
+        for name in self.orphans:
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(SMALL_GIF)
+
+    def media_names(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, files in os.walk(self.media_root)
+            for name in files
+        )
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('gc_media', dry_run=True, min_age=0, stdout=out)
+        for name in self.orphans:
+            self.assertIn(name, out.getvalue())
+        self.assertEqual(
+            self.media_names(), sorted(self.kept + self.orphans)
+        )
+
+    def test_removes_orphans(self):
+        call_command('gc_media', min_age=0, batch_size=2, stdout=StringIO())
+        self.assertEqual(self.media_names(), self.kept)
+        self.assertGreater(len(self.kept), 2)
+        self.post.delete()
+        call_command('gc_media', min_age=0, stdout=StringIO())
+        self.assertEqual(self.media_names(), [])
+
+
+class SuggestAuthorsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        names = ['reader', 'friend', 'friend2', 'star', 'other', 'neighbour']
+        cls.users = {name: User.objects.create_user(username=name)
+                     for name in names}
+        users = cls.users
+        for user, author in [
+            ('reader', 'friend'),
+            ('reader', 'friend2'),
+            ('friend', 'star'),
+            ('friend', 'other'),
+            ('friend', 'reader'),
+            ('friend2', 'star'),
+        ]:
+            Follow.objects.create(user=users[user], author=users[author])
+        group = Group.objects.create(title='группа', slug='group')
+        for name in ('reader', 'neighbour'):
+            Post.objects.create(text='пост', author=users[name], group=group)
+
+    def setUp(self):
+        cache.clear()
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('suggest_authors', *args, stdout=out)
+        return out.getvalue()
+
+    def suggested(self, name):
+        return [
+            suggestion.author.username for suggestion in
+            Suggestion.objects.filter(
+                user=self.users[name]
+            ).order_by('rank')
+        ]
+
+    def test_full_run(self):
+        self.assertIn('6', self.run_command())
+        self.assertEqual(
+            self.suggested('reader'), ['star', 'other', 'neighbour']
+        )
+        # friend приходит к себе через reader и исключается
+        self.assertEqual(self.suggested('friend'), ['friend2'])
+
+    def test_incremental_run(self):
+        self.run_command()
+        self.assertIn(': 0', self.run_command('--incremental'))
+        newcomer = User.objects.create_user(username='newcomer')
+        Follow.objects.create(user=self.users['friend2'], author=newcomer)
+        # newcomer без пересчёта, friend2 сменил подписки, reader
+        # подписан на friend2
+        self.assertEqual(
+            suggestions.stale_user_ids(),
+            sorted([newcomer.pk, self.users['friend2'].pk,
+                    self.users['reader'].pk]),
+        )
+        self.assertIn(': 3', self.run_command('--incremental'))
+        self.assertIn('newcomer', self.suggested('reader'))
+
+    def test_follow_index(self):
+        self.run_command()
+        client = Client()
+        client.force_login(self.users['reader'])
+        url = reverse('posts:follow_index')
+        response = client.get(url)
+        self.assertEqual(
+            [author.username for author in response.context['suggestions']],
+            ['star', 'other', 'neighbour'],
+        )
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['star']
+        )
+        response = client.get(url)
+        self.assertNotIn('star', [
+            author.username for author in response.context['suggestions']
+        ])
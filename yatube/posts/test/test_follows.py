@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follows
+from ..models import Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{n}') for n in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_following_ids_are_cached(self):
+        reader, author = FollowGraphTests.reader, FollowGraphTests.authors[0]
+        self.assertEqual(follows.following_ids(reader.pk), frozenset())
+        with self.assertNumQueries(0):
+            follows.following_ids(reader.pk)
+        Follow.objects.create(user=reader, author=author)
+        self.assertEqual(follows.following_ids(reader.pk), {author.pk})
+        Follow.objects.filter(user=reader).delete()
+        self.assertEqual(follows.following_ids(reader.pk), frozenset())
+
+    def test_bulk_is_following(self):
+        reader = FollowGraphTests.reader
+        first, second, third = FollowGraphTests.authors
+        follows.follow(reader, first)
+        follows.follow(reader, third)
+        follows.following_ids(reader.pk)
+        with self.assertNumQueries(0):
+            followed = follows.is_following(
+                reader, [first.pk, second.pk, third.pk]
+            )
+        self.assertEqual(followed, {first.pk, third.pk})
+        self.assertEqual(
+            follows.is_following(AnonymousUser(), [first.pk]), set()
+        )
+
+    def test_follow_inserts_once(self):
+        reader, author = FollowGraphTests.reader, FollowGraphTests.authors[0]
+        self.assertTrue(follows.follow(reader, author))
+        self.assertFalse(follows.follow(reader, author))
+        self.assertFalse(follows.follow(reader, reader))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=author).followers_count, 1
+        )
+        self.assertTrue(follows.unfollow(reader, author))
+        self.assertFalse(follows.unfollow(reader, author))
+        self.assertEqual(
+            UserStats.objects.get(user=author).followers_count, 0
+        )
+
+
+class CardFollowButtonsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = []
+        for n in range(6):
+            author = User.objects.create_user(username=f'author{n}')
+            Post.objects.create(text=f'пост {n}', author=author)
+            cls.authors.append(author)
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(CardFollowButtonsTests.reader)
+        cache.clear()
+
+    def fragments(self, authors):
+        return self.auth_client.get(reverse('posts:user_fragments'), {
+            'path': reverse('posts:index'),
+            'authors': ','.join(str(author.pk) for author in authors),
+        })
+
+    def test_cards_have_follow_slots(self):
+        author = CardFollowButtonsTests.authors[0]
+        response = self.auth_client.get(reverse('posts:index'))
+        self.assertContains(response, f'data-fragment="follow:{author.pk}"')
+
+    def test_buttons_for_all_authors(self):
+        reader = CardFollowButtonsTests.reader
+        authors = CardFollowButtonsTests.authors
+        fragments = self.fragments([*authors, reader]).json()
+        self.assertIn('Отписаться', fragments[f'follow:{authors[0].pk}'])
+        self.assertIn('Подписаться', fragments[f'follow:{authors[1].pk}'])
+        self.assertNotIn(f'follow:{reader.pk}', fragments)
+
+    def test_query_count_does_not_depend_on_authors(self):
+        authors = CardFollowButtonsTests.authors
+        self.fragments(authors[:1])
+        with CaptureQueriesContext(connection) as one:
+            self.fragments(authors[:1])
+        with CaptureQueriesContext(connection) as many:
+            self.fragments(authors)
+        self.assertEqual(len(many), len(one))
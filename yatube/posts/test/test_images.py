@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.models import StoredFile
+
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def jpeg_upload(width, height, name='photo.jpg'):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    content = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(
+        content, 'JPEG', exif=exif.tobytes()
+    )
+    return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_WORKERS=0,
+    POST_IMAGE_MAX_SIDE=200,
+)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(ImageIngestTests.user)
+
+    def create_post(self, image):
+        return self.auth_client.post(
+            reverse('posts:post_create'),
+            {'text': 'пост', 'image': image},
+        )
+
+    def test_original_resized_and_stripped(self):
+        self.create_post(jpeg_upload(800, 400))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (200, 100))
+            self.assertFalse(image.getexif())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_byte_limit(self):
+        response = self.create_post(jpeg_upload(50, 50))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 100\xa0байт.'
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_pixel_limit(self):
+        self.create_post(jpeg_upload(50, 50))
+        self.assertFalse(Post.objects.exists())
+
+    def test_duplicate_upload_shares_file(self):
+        self.create_post(jpeg_upload(300, 300, 'first.jpg'))
+        self.create_post(jpeg_upload(300, 300, 'second.jpg'))
+        first, second = Post.objects.all()
+        self.assertEqual(first.image.name, second.image.name)
+
+    def test_same_image_reupload_keeps_one_ref(self):
+        self.create_post(jpeg_upload(300, 300))
+        post = Post.objects.get()
+        name = post.image.name
+        # TestCase не выполняет on_commit: освобождение вызывается сразу
+        with mock.patch(
+            'posts.thumbnails.transaction.on_commit', lambda func: func()
+        ):
+            self.auth_client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                {'text': 'пост', 'image': jpeg_upload(300, 300)},
+            )
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, name)
+            self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+            post.delete()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name)))
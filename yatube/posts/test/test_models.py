@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
-from ..models import Post, Group
+from ..models import Comment, Follow, Post, Group
 
 User = get_user_model()
 
@@ -40,3 +40,55 @@ class GroupModelTest(TestCase):
     def test_models_have_correct_object_names(self):
         group = GroupModelTest.group
         self.assertEqual('Тестовая группа', str(group))
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+
+    def refresh(self):
+        for obj in (CountersTest.group, CountersTest.user.stats,
+                    CountersTest.reader.stats):
+            obj.refresh_from_db()
+
+    def test_post_counters(self):
+        post = Post.objects.create(
+            author=CountersTest.user,
+            text='пост',
+            group=CountersTest.group,
+        )
+        self.refresh()
+        self.assertEqual(CountersTest.user.stats.posts_count, 1)
+        self.assertEqual(CountersTest.group.posts_count, 1)
+        post.group = None
+        post.save()
+        self.refresh()
+        self.assertEqual(CountersTest.group.posts_count, 0)
+        Comment.objects.create(post=post, author=CountersTest.reader, text='к')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        post.delete()
+        self.refresh()
+        self.assertEqual(CountersTest.user.stats.posts_count, 0)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(
+            user=CountersTest.reader,
+            author=CountersTest.user,
+        )
+        self.refresh()
+        self.assertEqual(CountersTest.user.stats.followers_count, 1)
+        self.assertEqual(CountersTest.reader.stats.following_count, 1)
+        follow.delete()
+        self.refresh()
+        self.assertEqual(CountersTest.user.stats.followers_count, 0)
+        self.assertEqual(CountersTest.reader.stats.following_count, 0)
@@ -0,0 +1,97 @@
+import re
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# SCAN без USING — полный проход по таблице
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class QueryPlanTests(TestCase):
+    """Запросы лент не должны читать таблицы целиком и сортировать."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for n in range(15):
+            cls.post = Post.objects.create(
+                text=f'пост {n}',
+                author=cls.author,
+                group=cls.group,
+            )
+        Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='комментарий',
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(QueryPlanTests.reader)
+        cache.clear()
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url, params=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for detail in self.plan(sql):
+                with self.subTest(url=url, params=params, sql=sql):
+                    self.assertIsNone(FULL_SCAN.match(detail), detail)
+                    self.assertNotIn(TEMP_SORT, detail)
+        return response
+
+    def assert_feed_indexed(self, url):
+        page_obj = self.assert_indexed(url).context['page_obj']
+        second_page = self.assert_indexed(
+            url, {'after': page_obj.next_cursor}
+        ).context['page_obj']
+        self.assert_indexed(url, {'before': second_page.previous_cursor})
+
+    def test_index(self):
+        self.assert_feed_indexed(reverse('posts:index'))
+
+    def test_group_posts(self):
+        self.assert_feed_indexed(
+            reverse('posts:group_list', args=[QueryPlanTests.group.slug])
+        )
+
+    def test_profile(self):
+        self.assert_feed_indexed(
+            reverse('posts:profile', args=[QueryPlanTests.author.username])
+        )
+
+    def test_post_detail(self):
+        self.assert_indexed(
+            reverse('posts:post_detail', args=[QueryPlanTests.post.pk])
+        )
+
+    def test_follow_index(self):
+        self.assert_feed_indexed(reverse('posts:follow_index'))
+
+    @override_settings(FEED_PULL_THRESHOLD=0)
+    def test_follow_index_pull(self):
+        self.assert_feed_indexed(reverse('posts:follow_index'))
@@ -0,0 +1,94 @@
+import unittest
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..checks import check_search_index
+from ..models import Post
+
+User = get_user_model()
+
+
+@unittest.skipUnless(search.supported(), 'SQLite FTS5')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Кошка спит на <b>диване</b>',
+            author=cls.user,
+        )
+        for n in range(12):
+            Post.objects.create(
+                text=f'Собака номер {n} гуляет' + ' и гуляет' * n,
+                author=cls.user,
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def find(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, response.context['page_obj']
+
+    def test_highlighted_snippet(self):
+        response, page_obj = self.find('кошк')
+        self.assertEqual(list(page_obj), [SearchTests.post])
+        self.assertContains(response, '<mark>Кошка</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_ranked_cursor_pages(self):
+        _, first = self.find('гуляет')
+        self.assertEqual(len(first), 10)
+        self.assertTrue(first.has_next())
+        _, second = self.find('гуляет', after=first.next_cursor)
+        self.assertEqual(len(second), 2)
+        ids = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(len(set(ids)), 12)
+        _, back = self.find('гуляет', before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_index_follows_changes(self):
+        post = SearchTests.post
+        Post.objects.filter(pk=post.pk).update(text='Попугай молчит')
+        self.assertEqual(len(self.find('кошка')[1]), 0)
+        self.assertEqual(list(self.find('попугай')[1]), [post])
+        post.delete()
+        self.assertEqual(len(self.find('попугай')[1]), 0)
+
+    def test_fts_syntax_is_not_exposed(self):
+        response, page_obj = self.find('кошка OR "NEAR(')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.FTS_TABLE} ({search.FTS_TABLE}) "
+                f"VALUES ('delete-all')"
+            )
+        self.assertEqual(len(self.find('кошка')[1]), 0)
+        out = StringIO()
+        call_command('rebuild_search', stdout=out)
+        self.assertIn('13', out.getvalue())
+        self.assertEqual(len(self.find('кошка')[1]), 1)
+
+    def test_index_installed_after_migrations(self):
+        """Миграции тестовой базы не потеряли триггеры поиска."""
+        self.assertEqual(check_search_index(None), [])
+
+    def test_missing_trigger_reported(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_update')
+        errors = check_search_index(None)
+        self.assertEqual([error.id for error in errors], ['posts.E001'])
+        self.assertIn(f'{search.FTS_TABLE}_update', errors[0].msg)
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(check_search_index(None), [])
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        self.post = Post.objects.create(
+            text='пост с картинкой',
+            author=ThumbnailTests.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def test_placeholder_until_generated(self):
+        url = reverse('posts:index')
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.guest_client.get(url)
+        schedule.assert_called_with(self.post.image.name)
+        self.assertContains(response, thumbnails.PLACEHOLDER)
+        updated = self.post.updated
+        thumbnails.generate(self.post.image.name)
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.updated, updated)
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, thumbnails.PLACEHOLDER)
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_render_does_not_generate(self):
+        thumbnails.generate(self.post.image.name)
+        self.assertIsNotNone(
+            thumbnails.ready_thumbnail(self.post.image, 'card')
+        )
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend'
+                        '._create_thumbnail') as create:
+            self.guest_client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        create.assert_not_called()
+
+    def test_page_prefetches_thumbnails(self):
+        """Миниатюры страницы читаются из хранилища одним запросом."""
+        for n in range(3):
+            post = Post.objects.create(
+                text=f'ещё пост {n}',
+                author=ThumbnailTests.user,
+                image=SimpleUploadedFile(
+                    f'small{n}.gif', SMALL_GIF, 'image/gif'
+                ),
+            )
+            thumbnails.generate(post.image.name)
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in context.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertNotContains(response, thumbnails.PLACEHOLDER)
+
+    def test_detail_prefetches_thumbnails(self):
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        kvstore_queries = [
+            query for query in context.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertNotContains(response, thumbnails.PLACEHOLDER)
+
+    def test_srcset(self):
+        thumbnails.generate(self.post.image.name)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, 'loading="lazy"')
+        for width in thumbnails.CARD_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+
+    def test_webp_source(self):
+        thumbnails.generate(self.post.image.name)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, '<source type="image/webp"')
+        webp = thumbnails.ready_thumbnail(
+            self.post.image, f'card_{thumbnails.CARD_WIDTH}_webp'
+        )
+        self.assertContains(response, webp.url)
+        with Image.open(os.path.join(TEMP_MEDIA_ROOT, webp.name)) as image:
+            self.assertEqual(image.format, 'WEBP')
@@ -2,7 +2,9 @@ import shutil
 import tempfile
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
@@ -10,7 +12,10 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from http import HTTPStatus
 from django.conf import settings
 
-from ..models import Post, Group, Follow
+from .. import feed
+from ..models import Comment, Post, Group, Follow, FeedItem, UserStats
+from ..paginator import CursorPaginator
+from ..views import COMMENT_THREAD_DEPTH, COMMENTS_PER_PAGE
 
 User = get_user_model()
 
@@ -186,6 +191,41 @@ class PaginatorViewsTests(TestCase):
                         5
                     )
 
+    def test_cursor_pages(self):
+        url = reverse('posts:index')
+        first_page = self.auth_client.get(url).context['page_obj']
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        second_page = self.auth_client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(second_page.has_next())
+        seen = [post.pk for post in first_page] + [
+            post.pk for post in second_page
+        ]
+        self.assertEqual(len(set(seen)), 15)
+        back_page = self.auth_client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in back_page],
+            [post.pk for post in first_page]
+        )
+        broken_cursor = self.auth_client.get(url, {'after': 'kek'})
+        self.assertEqual(
+            len(broken_cursor.context['page_obj']),
+            10
+        )
+        # курсоры, которые разбираются, но не подходят к ключу
+        for values in ([1, 1], [{}, 1], [None, 1], ['2022-01-01', 'x']):
+            with self.subTest(values=values):
+                cursor = CursorPaginator(Post.objects.all(), 10).encode_values(
+                    values
+                )
+                response = self.auth_client.get(url, {'after': cursor})
+                self.assertEqual(len(response.context['page_obj']), 10)
+
     def test_context_group(self):
         response = self.auth_client.get(reverse(
             'posts:group_list',
@@ -210,6 +250,8 @@ class PaginatorViewsTests(TestCase):
                     post.author.username,
                     PaginatorViewsTests.user.username
                 )
+        self.assertEqual(response.context['view_name'], 'posts:profile')
+        self.assertNotContains(response, 'Автор:')
 
 
 class CommentViewsTests(TestCase):
@@ -257,6 +299,155 @@ class CommentViewsTests(TestCase):
         self.assertContains(response, self.comment_data['text'])
 
 
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Test text', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for n in range(start, start + count):
+            Comment.objects.create(
+                post=CommentPaginationTests.post,
+                author=User.objects.create_user(username=f'commenter{n}'),
+                text=f'комментарий {n}',
+            )
+
+    def detail_queries(self):
+        cache.clear()
+        url = reverse('posts:post_detail', args=[self.post.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        return len(queries)
+
+    def test_query_count_does_not_grow(self):
+        self.add_comments(3)
+        queries = self.detail_queries()
+        self.add_comments(COMMENTS_PER_PAGE * 2)
+        self.assertEqual(self.detail_queries(), queries)
+
+    def test_load_more(self):
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertContains(response, 'data-more-comments')
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'after': comments.next_cursor},
+        )
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertNotContains(response, 'data-more-comments')
+        shown = [comment.pk for comment in [*comments, *rest]]
+        self.assertEqual(
+            shown, list(Comment.objects.values_list('pk', flat=True))
+        )
+
+    def test_comments_fragment_errors(self):
+        url = reverse('posts:post_comments', args=[self.post.id])
+        self.assertEqual(
+            self.guest_client.get(url, {'after': 'oops'}).status_code,
+            HTTPStatus.NOT_FOUND,
+        )
+        self.assertEqual(
+            self.guest_client.get(
+                reverse('posts:post_comments', args=[999])
+            ).status_code,
+            HTTPStatus.NOT_FOUND,
+        )
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Test text', author=cls.user)
+        cls.other_post = Post.objects.create(text='другой', author=cls.user)
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(CommentThreadTests.user)
+        cache.clear()
+
+    def comment(self, text, parent=None, post=None):
+        return Comment.objects.create(
+            post=post or CommentThreadTests.post,
+            author=CommentThreadTests.user,
+            text=text,
+            parent=parent,
+        )
+
+    def test_thread_order(self):
+        first = self.comment('первая ветка')
+        reply = self.comment('ответ', first)
+        nested = self.comment('ответ на ответ', reply)
+        late_reply = self.comment('поздний ответ', first)
+        second = self.comment('вторая ветка')
+        response = self.auth_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertEqual(
+            list(response.context['comments']),
+            [second, first, reply, nested, late_reply],
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(first.descendants()), [reply, nested, late_reply]
+            )
+        self.assertEqual(list(first.descendants(depth=1)), [reply, late_reply])
+
+    def test_deep_thread_continues(self):
+        parent = root = self.comment('корень')
+        chain = []
+        for level in range(COMMENT_THREAD_DEPTH + 2):
+            parent = self.comment(f'уровень {level}', parent)
+            chain.append(parent)
+        response = self.auth_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        shown = list(response.context['comments'])
+        self.assertEqual(shown, [root, *chain[:COMMENT_THREAD_DEPTH - 1]])
+        self.assertTrue(shown[-1].hidden_replies)
+        thread_url = reverse(
+            'posts:comment_thread', args=[self.post.id, shown[-1].id]
+        )
+        self.assertContains(response, thread_url)
+        response = self.auth_client.get(thread_url)
+        self.assertEqual(
+            list(response.context['comments']),
+            chain[COMMENT_THREAD_DEPTH - 1:],
+        )
+
+    def test_reply(self):
+        parent = self.comment('вопрос')
+        self.auth_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'ответ', 'parent': parent.id},
+        )
+        reply = Comment.objects.get(text='ответ')
+        self.assertEqual(reply.parent, parent)
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(parent.path))
+
+    def test_reply_to_other_post(self):
+        foreign = self.comment('чужой', post=CommentThreadTests.other_post)
+        self.auth_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'ответ', 'parent': foreign.id},
+        )
+        self.assertFalse(Comment.objects.filter(text='ответ').exists())
+
+
 class FollowTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -269,6 +460,7 @@ class FollowTests(TestCase):
         self.auth_client.force_login(FollowTests.user)
         self.username = FollowTests.user.username
         self.username1 = FollowTests.user1.username
+        cache.clear()
 
     def test_follow(self):
         self.auth_client.get(
@@ -299,8 +491,180 @@ class FollowTests(TestCase):
             )
         )
 
+    def test_follow_feed(self):
+        old_post = Post.objects.create(
+            text='старый пост',
+            author=FollowTests.user1,
+        )
+        self.auth_client.get(
+            reverse('posts:profile_follow', args=[self.username1])
+        )
+        new_post = Post.objects.create(
+            text='новый пост',
+            author=FollowTests.user1,
+        )
+        response = self.auth_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new_post.pk, old_post.pk]
+        )
+        self.auth_client.get(
+            reverse('posts:profile_unfollow', args=[self.username1])
+        )
+        response = self.auth_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(FEED_INBOX_LENGTH=2)
+    def test_follow_feed_length(self):
+        Follow.objects.create(user=FollowTests.user, author=FollowTests.user1)
+        for n in range(4):
+            Post.objects.create(text=f'пост {n}', author=FollowTests.user1)
+        self.assertEqual(
+            FeedItem.objects.filter(user=FollowTests.user).count(),
+            2
+        )
+        stats = UserStats.objects.filter(user=FollowTests.user)
+        self.assertEqual(stats.get().feed_length, 2)
+        Follow.objects.get(user=FollowTests.user).delete()
+        self.assertEqual(stats.get().feed_length, 0)
+
+    @override_settings(FEED_PULL_THRESHOLD=0)
+    def test_follow_feed_pull(self):
+        other_author = User.objects.create_user(username='auth2')
+        Follow.objects.create(user=FollowTests.user, author=other_author)
+        Follow.objects.create(user=FollowTests.user, author=FollowTests.user1)
+        cache.clear()
+        posts = [
+            Post.objects.create(text=f'пост {n}', author=author)
+            for n, author in enumerate(
+                [FollowTests.user1, other_author] * 7
+            )
+        ]
+        self.assertFalse(FeedItem.objects.exists())
+        url = reverse('posts:follow_index')
+        first_page = self.auth_client.get(url).context['page_obj']
+        second_page = self.auth_client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in first_page] + [
+                post.pk for post in second_page
+            ],
+            [post.pk for post in reversed(posts)]
+        )
+
+    def test_follow_feed_leaves_pull(self):
+        Follow.objects.create(user=FollowTests.user, author=FollowTests.user1)
+        url = reverse('posts:follow_index')
+        with override_settings(FEED_PULL_THRESHOLD=0):
+            cache.clear()
+            old_post = Post.objects.create(
+                text='старый пост', author=FollowTests.user1
+            )
+        self.assertFalse(FeedItem.objects.exists())
+        # подписчиков уже меньше порога, но пост ещё не разложен
+        cache.clear()
+        response = self.auth_client.get(url)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [old_post.pk]
+        )
+        # в запросе публикации посты автора не раскладываются
+        new_post = Post.objects.create(
+            text='новый пост', author=FollowTests.user1
+        )
+        self.assertFalse(FeedItem.objects.exists())
+        stats = UserStats.objects.filter(user=FollowTests.user1)
+        self.assertTrue(stats.get().feed_pulled)
+        response = self.auth_client.get(url)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new_post.pk, old_post.pk]
+        )
+        self.assertEqual(feed.settle_all(), 1)
+        self.assertEqual(
+            set(FeedItem.objects.values_list('post_id', flat=True)),
+            {old_post.pk, new_post.pk}
+        )
+        self.assertFalse(stats.get().feed_pulled)
+
+    def test_follow_feed_numbered_pages(self):
+        Follow.objects.create(user=FollowTests.user, author=FollowTests.user1)
+        posts = [
+            Post.objects.create(text=f'пост {n}', author=FollowTests.user1)
+            for n in range(3)
+        ]
+        response = self.auth_client.get(
+            reverse('posts:follow_index'), {'page': 1}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in reversed(posts)]
+        )
+
+
+class UserFragmentsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.user1 = User.objects.create_user(username='auth1')
+        cls.post = Post.objects.create(text='тестовый пост', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.auth_client = Client()
+        self.auth_client.force_login(UserFragmentsTests.user)
+        cache.clear()
+
+    def fragments(self, client, path):
+        return client.get(
+            reverse('posts:user_fragments'), {'path': path}
+        ).json()
+
+    def test_shell_is_shared(self):
+        url = reverse('posts:index')
+        auth_response = self.auth_client.get(url)
+        self.assertNotContains(auth_response, 'Выйти')
+        self.assertContains(auth_response, 'data-fragment="nav"')
+        self.assertEqual(
+            self.guest_client.get(url).content,
+            auth_response.content
+        )
+
+    def test_guest_fragments(self):
+        fragments = self.fragments(self.guest_client, '/profile/auth1/')
+        self.assertIn('Войти', fragments['nav'])
+        self.assertNotIn('follow', fragments)
+
+    def test_follow_fragment(self):
+        path = reverse('posts:profile', args=['auth1'])
+        fragments = self.fragments(self.auth_client, path)
+        self.assertIn('Выйти', fragments['nav'])
+        self.assertIn('Подписаться', fragments['follow'])
+        Follow.objects.create(
+            user=UserFragmentsTests.user,
+            author=UserFragmentsTests.user1,
+        )
+        fragments = self.fragments(self.auth_client, path)
+        self.assertIn('Отписаться', fragments['follow'])
+        own_profile = reverse('posts:profile', args=['auth'])
+        self.assertNotIn(
+            'follow',
+            self.fragments(self.auth_client, own_profile)
+        )
+
+    def test_post_detail_fragments(self):
+        path = reverse('posts:post_detail', args=[UserFragmentsTests.post.pk])
+        fragments = self.fragments(self.auth_client, path)
+        self.assertIn('Редактировать', fragments['post_edit'])
+        self.assertIn('csrfmiddlewaretoken', fragments['comment_form'])
+        self.auth_client.force_login(UserFragmentsTests.user1)
+        self.assertNotIn('post_edit', self.fragments(self.auth_client, path))
+
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class ImgUpload(TestCase):
     def setUp(self):
         self.auth_client = Client()
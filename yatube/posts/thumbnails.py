@@ -0,0 +1,257 @@
+"""Миниатюры картинок постов, которые готовятся в фоне.
+
+Все размеры, которые показывают шаблоны, перечислены в THUMBNAILS,
+у вариантов для srcset есть и WebP-копии для <source type="image/webp">.
+После сохранения поста миниатюры генерируются пулом потоков,
+а шаблонный тег post_image только читает готовые миниатюры
+из хранилища ключ-значение sorl. Пока их нет, тег отдаёт
+заглушку и ставит генерацию в очередь. Когда
+миниатюры готовы, кэш карточки и лент с постом сбрасывается.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.templatetags.static import static
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .caching import bump_post
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+CARD_WIDTH, CARD_HEIGHT = 960, 339
+# ширины вариантов карточки для srcset, пропорции у всех одинаковые
+CARD_WIDTHS = (320, 480, 640, 960)
+# суффикс имени WebP-копии размера
+WEBP_SUFFIX = '_webp'
+
+# имя размера: (геометрия sorl, параметры)
+THUMBNAILS = {
+    f'card_{width}': (
+        f'{width}x{round(width * CARD_HEIGHT / CARD_WIDTH)}',
+        {'crop': 'center', 'upscale': True},
+    )
+    for width in CARD_WIDTHS
+}
+THUMBNAILS.update({
+    name + WEBP_SUFFIX: (geometry, {**options, 'format': 'WEBP'})
+    for name, (geometry, options) in THUMBNAILS.items()
+})
+THUMBNAILS['card'] = THUMBNAILS[f'card_{CARD_WIDTH}']
+# размер: его варианты по возрастанию ширины
+RESPONSIVE = {
+    'card': [f'card_{width}' for width in CARD_WIDTHS],
+}
+PLACEHOLDER = 'img/placeholder.svg'
+
+_executor = None
+_executor_pid = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class Placeholder:
+    """Заглушка с размерами миниатюры, пока та генерируется."""
+
+    def __init__(self, geometry):
+        width, _, height = geometry.partition('x')
+        self.url = static(PLACEHOLDER)
+        self.width = int(width)
+        self.height = int(height or width)
+
+
+def thumbnail_file(image, geometry, options):
+    """ImageFile миниатюры с тем же именем, что даст get_thumbnail()."""
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+
+
+def source(name):
+    """Картинка поста по имени, в хранилище поля Post.image.
+
+    Хранилище входит в ключ sorl, поэтому миниатюры, созданные по имени,
+    находятся и по самому полю.
+    """
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def ready_thumbnail(image, spec):
+    """Готовая миниатюра из хранилища sorl или None."""
+    geometry, options = THUMBNAILS[spec]
+    return default.kvstore.get(thumbnail_file(image, geometry, options))
+
+
+def prefetch(images, spec='card'):
+    """Готовые миниатюры многих картинок за одно чтение хранилища.
+
+    Читаются все варианты размера из RESPONSIVE и их WebP-копии.
+    Ключи ищутся одним get_many в кэше sorl, не найденные там — одним
+    запросом к таблице хранилища. Возвращает
+    {(имя картинки, размер): миниатюра или None} для передачи
+    в контекст шаблона.
+    """
+    keys = {}
+    names = RESPONSIVE.get(spec, [spec])
+    names = names + [name + WEBP_SUFFIX for name in names]
+    for image in images:
+        if not image:
+            continue
+        for name in names:
+            geometry, options = THUMBNAILS[name]
+            key = add_prefix(thumbnail_file(image, geometry, options).key)
+            keys[key] = (image.name, name)
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kv_cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    result = {}
+    for key, image_spec in keys.items():
+        value = values.get(key)
+        # отсутствие sorl кэширует пустым классом-маркером
+        result[image_spec] = (
+            deserialize_image_file(value) if isinstance(value, str)
+            else None
+        )
+    return result
+
+
+def generate(name):
+    """Создаёт недостающие миниатюры картинки.
+
+    Если миниатюры пришлось создавать, сбрасывает кэш постов с ней.
+    """
+    image = source(name)
+    missing = [
+        spec for spec in THUMBNAILS if ready_thumbnail(image, spec) is None
+    ]
+    if not missing:
+        return
+    for spec in missing:
+        geometry, options = THUMBNAILS[spec]
+        get_thumbnail(image, geometry, **options)
+    posts = list(Post.objects.filter(image=name))
+    Post.objects.filter(image=name).update(updated=timezone.now())
+    for post in posts:
+        bump_post(post)
+
+
+def _run(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connection.close()
+
+
+def _get_executor():
+    # пул создаётся в каждом процессе заново: потоки не переживают fork
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def schedule(name):
+    """Ставит генерацию миниатюр в очередь, если её там ещё нет.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(_run, name)
+
+
+def schedule_on_commit(name):
+    transaction.on_commit(lambda: schedule(name))
+
+
+def delete(name):
+    """Удаляет миниатюры картинки."""
+    default.kvstore.delete(source(name), delete_thumbnails=True)
+
+
+def release_on_commit(name):
+    """После коммита освобождает ссылку на файл картинки.
+
+    Если файл удалён, удаляются и его миниатюры.
+    """
+    storage = Post._meta.get_field('image').storage
+
+    def release():
+        if storage.release(name):
+            delete(name)
+
+    transaction.on_commit(release)
+
+
+def _ready_variants(image, names, prefetched):
+    ready = []
+    for name in names:
+        if prefetched and (image.name, name) in prefetched:
+            thumbnail = prefetched[image.name, name]
+        else:
+            thumbnail = ready_thumbnail(image, name)
+        if thumbnail is None:
+            schedule(image.name)
+        else:
+            ready.append((thumbnail, thumbnail.width))
+    return ready
+
+
+def responsive(image, spec, prefetched=None):
+    """Миниатюра для src и готовые варианты для srcset.
+
+    Возвращает (миниатюра или заглушка, [(миниатюра, ширина)],
+    [(WebP-миниатюра, ширина)]). Недостающие варианты ставятся
+    в очередь.
+    """
+    names = RESPONSIVE.get(spec, [spec])
+    ready = _ready_variants(image, names, prefetched)
+    if not ready:
+        return Placeholder(THUMBNAILS[spec][0]), [], []
+    webp = _ready_variants(
+        image, [name + WEBP_SUFFIX for name in names], prefetched
+    )
+    return ready[-1][0], ready, webp
@@ -1,44 +1,75 @@
-from django.core.paginator import Paginator
+from urllib.parse import urlencode, urlsplit
+
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db.models import Exists, OuterRef
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve
+from django.views.decorators.cache import never_cache
 
-from .models import Group, Post, Comment, Follow
+from .models import Group, Post, Comment
 from .forms import PostForm, CommentForm
+from .caching import (
+    GLOBAL_SCOPE,
+    author_scope,
+    cached_response,
+    conditional_response,
+    group_scope,
+    page_etag,
+    post_scope,
+    suggestions_scope,
+)
+from .counters import user_stats
+from .feed import feed_page, feed_scopes
+from .follows import follow, following_ids, is_following, unfollow
+from .paginator import CursorPaginator, InvalidCursor, paginate
+from .search import SearchPaginator
+from .suggestions import suggested_authors
+from . import thumbnails
 
 POSTS_PER_PAGE: int = 10
+# сколько рекомендованных авторов показывает лента подписок
+SUGGESTIONS_SHOWN: int = 5
+# сколько кнопок подписки на авторов карточек отдаёт user_fragments
+FOLLOW_BUTTONS_LIMIT: int = 100
+COMMENTS_PER_PAGE: int = 20
+# сколько уровней ответов показывается сразу
+COMMENT_THREAD_DEPTH: int = 5
 
 User = get_user_model()
 
 
-@cache_page(20)
 def index(request):
-    posts = Post.objects.select_related('author').all()
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {
-        "page_obj": page_obj,
-    }
-    return render(request, 'posts/index.html', context)
+    def render_page():
+        posts = Post.objects.select_related('author', 'group').all()
+        page_obj = paginate(request, posts, POSTS_PER_PAGE)
+        context = {
+            "page_obj": page_obj,
+            "shell": True,
+        }
+        return render(request, 'posts/index.html', context)
+
+    return cached_response(request, [GLOBAL_SCOPE], render_page)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    paginator = Paginator(
-        group.posts.select_related('author').all(),
-        POSTS_PER_PAGE
-    )
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {
-        "group": group,
-        'page_obj': page_obj,
-        "count": paginator.count,
-    }
-    return render(request, 'posts/group_list.html', context)
+
+    def render_page():
+        posts = group.posts.select_related('author').all()
+        page_obj = paginate(request, posts, POSTS_PER_PAGE)
+        context = {
+            "group": group,
+            'page_obj': page_obj,
+            "count": group.posts_count,
+            "shell": True,
+        }
+        return render(request, 'posts/group_list.html', context)
+
+    return cached_response(request, [group_scope(group.pk)], render_page)
 
 
 @login_required
@@ -59,42 +90,106 @@ def post_create(request):
 
 
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    is_following = (
-        request.user.is_authenticated
-        and Follow.objects.filter(
-            user=request.user,
-            author=user,
-        ).exists()
+    user = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+
+    def render_page():
+        stats = user_stats(user)
+        posts = user.posts.select_related('author', 'group').all()
+        page_obj = paginate(request, posts, POSTS_PER_PAGE)
+        context = {
+            'username': user,
+            'page_obj': page_obj,
+            'count': stats.posts_count,
+            'stats': stats,
+            'shell': True,
+        }
+        return render(request, 'posts/profile.html', context)
+
+    return cached_response(request, [author_scope(user.pk)], render_page)
+
+
+def comments_page(comments, max_depth, after=None):
+    """Страница комментариев в порядке веток, с авторами.
+
+    Одна страница — один запрос по индексу (post, path). Ответы глубже
+    max_depth не показываются: у комментария на последнем уровне
+    hidden_replies говорит, что ветку можно продолжить.
+    """
+    hidden = Comment.objects.filter(
+        parent=OuterRef('pk'), depth__gt=max_depth
     )
-    paginator = Paginator(
-        user.posts.select_related('author').all(),
-        POSTS_PER_PAGE
+    paginator = CursorPaginator(
+        comments.filter(depth__lte=max_depth)
+        .select_related('author')
+        .annotate(hidden_replies=Exists(hidden)),
+        COMMENTS_PER_PAGE,
+        ordering=('path',),
     )
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {
-        'username': user,
-        'page_obj': page_obj,
-        'count': paginator.count,
-        'following': is_following
-    }
-    print(page_obj.paginator)
-    return render(request, 'posts/profile.html', context)
+    return paginator.page(after=after)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    count = Post.objects.filter(author=post.author).count()
-    comments = Comment.objects.filter(post=post)
-    form = CommentForm(request.POST or None)
-    context = {
-        'post': post,
-        'count': count,
-        'comments': comments,
-        'form': form,
-    }
-    return render(request, 'posts/post_detail.html', context)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+
+    def render_page():
+        count = user_stats(post.author).posts_count
+        comments = comments_page(
+            Comment.objects.filter(post=post), COMMENT_THREAD_DEPTH - 1
+        )
+        context = {
+            'post': post,
+            'count': count,
+            'comments': comments,
+            'thumbnails': thumbnails.prefetch([post.image]),
+            'shell': True,
+        }
+        return render(request, 'posts/post_detail.html', context)
+
+    return cached_response(
+        request,
+        [post_scope(post.pk), author_scope(post.author_id)],
+        render_page,
+        last_modified=True,
+    )
+
+
+def post_comments(request, post_id, comment_id=None):
+    """Следующая страница комментариев или продолжение ветки.
+
+    Фрагмент встаёт на место ссылки «Показать ещё» или «Продолжить
+    ветку», поэтому отступы ответов остаются как на странице поста.
+    """
+    if comment_id is None:
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
+        comments = Comment.objects.filter(post_id=post_id)
+        max_depth = COMMENT_THREAD_DEPTH - 1
+    else:
+        comment = get_object_or_404(Comment, pk=comment_id, post_id=post_id)
+        comments = comment.descendants()
+        max_depth = comment.depth + COMMENT_THREAD_DEPTH
+
+    def render_page():
+        try:
+            page = comments_page(
+                comments, max_depth, request.GET.get('after')
+            )
+        except InvalidCursor:
+            raise Http404
+        context = {
+            'post_id': post_id,
+            'comment_id': comment_id,
+            'comments': page,
+        }
+        return render(request, 'includes/comment_list.html', context)
+
+    return cached_response(request, [post_scope(post_id)], render_page)
 
 
 @login_required
@@ -121,7 +216,7 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    form = CommentForm(request.POST or None)
+    form = CommentForm(request.POST or None, post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -132,33 +227,136 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author').all()
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
-    context = {
-        "page_obj": page_obj,
-    }
-    return render(request, 'posts/follow.html', context)
+    def render_page():
+        page_obj = feed_page(request, request.user, POSTS_PER_PAGE)
+        context = {
+            "page_obj": page_obj,
+            "suggestions": suggested_authors(request.user, SUGGESTIONS_SHOWN),
+        }
+        return render(request, 'posts/follow.html', context)
+
+    # страница не кэшируется, но повторный запрос без изменений
+    # в подписках и рекомендациях получает 304
+    scopes = feed_scopes(request.user) + [suggestions_scope(request.user.pk)]
+    etag = page_etag(request, scopes, request.user.pk)
+    return conditional_response(request, etag, render_page)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    is_following = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if request.user != author and not is_following:
-        Follow.objects.create(user=request.user, author=author)
+    follow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.filter(
-        user=request.user,
-        author__username=username
-    ).delete()
+    author = get_object_or_404(User, username=username)
+    unfollow(request.user, author)
     return redirect('posts:profile', username=username)
+
+
+def search(request):
+    """Поиск по текстам постов, самые релевантные сверху."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(query, POSTS_PER_PAGE).get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@never_cache
+def user_fragments(request):
+    """Части страницы, зависящие от пользователя.
+
+    Страницы лент кэшируются одинаковыми для всех посетителей, а
+    ссылки пользователя, вкладки, кнопка подписки и форма комментария
+    подгружаются отсюда одним запросом по пути страницы.
+    """
+    try:
+        match = resolve(urlsplit(request.GET.get('path', '')).path)
+        view_name, view_kwargs = match.view_name, match.kwargs
+    except Resolver404:
+        view_name, view_kwargs = '', {}
+    fragments = {
+        'nav': render_to_string('includes/user_nav.html', {
+            'view_name': view_name,
+            'view_kwargs': view_kwargs,
+        }, request),
+    }
+    if not request.user.is_authenticated:
+        return JsonResponse(fragments)
+    if view_name == 'posts:index':
+        fragments['switcher'] = render_to_string(
+            'includes/switcher.html', {'index': True}, request
+        )
+    elif view_name == 'posts:profile':
+        username = view_kwargs['username']
+        if username != request.user.username:
+            author_id = User.objects.filter(username=username).values_list(
+                'pk', flat=True
+            ).first()
+            fragments['follow'] = render_to_string(
+                'includes/follow_button.html',
+                {
+                    'username': username,
+                    'following': author_id in following_ids(request.user.pk),
+                },
+                request
+            )
+    elif view_name == 'posts:post_detail':
+        post = Post.objects.filter(pk=view_kwargs['post_id']).only(
+            'author_id'
+        ).first()
+        if post is not None:
+            if post.author_id == request.user.pk:
+                fragments['post_edit'] = render_to_string(
+                    'includes/post_edit_link.html', {'post': post}, request
+                )
+            fragments['comment_form'] = render_to_string(
+                'includes/comment_form.html',
+                {'post': post, 'form': CommentForm(post=post)},
+                request
+            )
+    fragments.update(card_follow_buttons(request))
+    return JsonResponse(fragments)
+
+
+def card_follow_buttons(request):
+    """Кнопки подписки для карточек страницы: {'follow:<id>': html}.
+
+    id авторов страница передаёт в ?authors=; состояние подписки на всех
+    берётся из одного кэшированного множества, имена — одним запросом.
+    """
+    author_ids = {
+        int(author_id)
+        for author_id in request.GET.get('authors', '').split(',')
+        if author_id.isdigit()
+    }
+    if not author_ids:
+        return {}
+    author_ids = sorted(author_ids)[:FOLLOW_BUTTONS_LIMIT]
+    followed = is_following(request.user, author_ids)
+    authors = User.objects.filter(pk__in=author_ids).exclude(
+        pk=request.user.pk
+    ).values_list('pk', 'username')
+    return {
+        f'follow:{author_id}': render_to_string(
+            'includes/follow_button.html',
+            {
+                'username': username,
+                'following': author_id in followed,
+                'small': True,
+            },
+            request
+        )
+        for author_id, username in authors
+    }
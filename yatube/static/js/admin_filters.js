@@ -0,0 +1,12 @@
+// Фильтры списков админки с автокомплитом: выбор значения
+// открывает список, отфильтрованный по нему.
+(function ($) {
+    $(function () {
+        $('.autocomplete-filter select').on('change', function () {
+            var value = $(this).val();
+            window.location = value
+                ? this.dataset.filterUrl.replace('__value__', encodeURIComponent(value))
+                : $(this).closest('ul').find('a').attr('href') || '?';
+        });
+    });
+})(django.jQuery);
@@ -0,0 +1,31 @@
+// Кнопки «Показать ещё» и «Продолжить ветку» под комментариями:
+// следующая страница приходит готовым HTML и встаёт на место кнопки.
+// «Ответить» открывает форму комментария с выбранным родителем.
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('[data-more-comments]');
+    var reply = event.target.closest('[data-reply-to]');
+    if (link) {
+        event.preventDefault();
+        fetch(link.href, {credentials: 'same-origin'})
+            .then(function (response) {
+                return response.ok ? response.text() : null;
+            })
+            .then(function (html) {
+                if (html !== null) {
+                    link.outerHTML = html;
+                }
+            });
+    } else if (reply) {
+        var form = document.querySelector('#add_comment form');
+        if (!form) {
+            return;
+        }
+        event.preventDefault();
+        form.elements.parent.value = reply.dataset.replyTo;
+        var label = form.querySelector('[data-reply-label]');
+        label.textContent = 'Ответ для ' + reply.dataset.replyAuthor;
+        label.hidden = false;
+        document.getElementById('add_comment').classList.add('show');
+        form.elements.text.focus();
+    }
+});
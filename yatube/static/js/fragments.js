@@ -0,0 +1,36 @@
+// Страницы лент кэшируются одинаковыми для всех посетителей.
+// Части, зависящие от пользователя, приходят одним запросом
+// и вставляются в элементы с атрибутом data-fragment. Кнопкам
+// подписки в карточках (data-fragment="follow:<id автора>") нужны
+// id авторов страницы, они передаются в параметре authors.
+(function () {
+    var slots = document.querySelectorAll('[data-fragment]');
+    var url = document.body.dataset.fragmentsUrl;
+    if (!slots.length || !url) {
+        return;
+    }
+    var path = window.location.pathname + window.location.search;
+    var authors = [];
+    slots.forEach(function (slot) {
+        var name = slot.dataset.fragment;
+        if (name.indexOf('follow:') === 0 && authors.indexOf(name.slice(7)) === -1) {
+            authors.push(name.slice(7));
+        }
+    });
+    var query = '?path=' + encodeURIComponent(path);
+    if (authors.length) {
+        query += '&authors=' + authors.join(',');
+    }
+    fetch(url + query, {credentials: 'same-origin'})
+        .then(function (response) {
+            return response.ok ? response.json() : {};
+        })
+        .then(function (fragments) {
+            slots.forEach(function (slot) {
+                var html = fragments[slot.dataset.fragment];
+                if (html !== undefined) {
+                    slot.innerHTML = html;
+                }
+            });
+        });
+})();
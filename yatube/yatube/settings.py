@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -19,12 +21,22 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
+# профиль настроек: YATUBE_ENV=production на боевом сервере
+PRODUCTION = os.environ.get('YATUBE_ENV') == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = '78m#f2i2bo*68p(0+4e#hj@%ud7yzhikkw(zu4s^o)nmm=+p#b'
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY')
+if not SECRET_KEY:
+    if PRODUCTION:
+        # ключ из репозитория известен всем: на боевом сервере он свой
+        raise ImproperlyConfigured(
+            'YATUBE_SECRET_KEY обязателен при YATUBE_ENV=production'
+        )
+    SECRET_KEY = '78m#f2i2bo*68p(0+4e#hj@%ud7yzhikkw(zu4s^o)nmm=+p#b'
 
 # SECURITY WARNING: don't run with debug turned on in production!
 
-DEBUG = True
+DEBUG = not PRODUCTION
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -32,6 +44,11 @@ ALLOWED_HOSTS = [
     '[::1]',
     'testserver',
 ]
+if PRODUCTION:
+    ALLOWED_HOSTS += [
+        host for host in os.environ.get('YATUBE_HOSTS', '').split(',')
+        if host
+    ]
 
 
 # Application definition
@@ -43,7 +60,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'posts',
+    'posts.apps.PostsConfig',
     'users',
     'core',
     'about',
@@ -80,11 +97,30 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.view_name.view_name',
             ],
         },
     },
 ]
 
+# шаблоны разбираются один раз за жизнь воркера; при старте
+# воркера их компилирует команда warm_templates (см. wsgi.py)
+WARM_TEMPLATES = PRODUCTION
+
+if PRODUCTION:
+    INSTALLED_APPS.remove('debug_toolbar')
+    MIDDLEWARE.remove('debug_toolbar.middleware.DebugToolbarMiddleware')
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+    TEMPLATES[0]['OPTIONS']['context_processors'].remove(
+        'django.template.context_processors.debug'
+    )
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -138,6 +174,10 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# сюда collectstatic собирает статику для раздачи веб-сервером
+STATIC_ROOT = os.environ.get(
+    'YATUBE_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles')
+)
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -151,16 +191,59 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # перенаправление при ошибке csrf токена на кастомную вьюху
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# тесты пишут кэш во временный файл, а не в общий с сервером
+TEST_RUNNER = 'core.runner.TestRunner'
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# общий для всех воркеров кэш в файле SQLite на этом сервере; файл
+# свой у каждого проекта, тесты подменяют его временным (core.runner)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
     }
 }
 
+# страницы лент сбрасываются версиями при изменениях, поэтому
+# их можно хранить долго
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# ключ карточки поста меняется вместе с Post.updated
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
 INTERNAL_IPS = [
     '127.0.0.1',
-] 
\ No newline at end of file
+]
+
+# сколько последних записей хранится в ленте подписок пользователя
+FEED_INBOX_LENGTH = 1000
+# посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а читаются при открытии ленты
+FEED_PULL_THRESHOLD = 5000
+
+# потоки, создающие миниатюры картинок постов после сохранения;
+# 0 — создавать сразу, в том же потоке
+THUMBNAIL_WORKERS = 2
+# миниатюры пишутся целиком под своим именем, без копий с суффиксом
+# при одновременной генерации
+THUMBNAIL_STORAGE = 'core.storages.AtomicFileSystemStorage'
+
+# ограничения на загружаемые картинки постов; оригинал хранится
+# не больше POST_IMAGE_MAX_SIDE пикселей по длинной стороне
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+
+# списки админки не считают строки дальше этого числа: показывают
+# оценку по статистике СУБД или нижнюю границу
+ESTIMATED_COUNT_LIMIT = 10000
+
+# сколько рекомендованных авторов хранится на пользователя
+SUGGESTIONS_PER_USER = 10